@@ -0,0 +1,65 @@
+"""Ordering and type-ahead search over the category list.
+
+Large taxonomies are navigated by typing: ``fuzzy_score`` ranks a category by
+how well the typed text matches it (exact substring first, then a
+subsequence of its letters), and ``rank_categories`` combines that with the
+chosen ordering of the list itself.
+"""
+
+ORDERINGS = ("default", "frequent", "recent")
+
+
+def fuzzy_score(text, name):
+    """How well text matches name, or None if it doesn't. Higher is better.
+
+    Both are expected in lower case. A substring match always beats a
+    subsequence match; earlier and word-start matches score higher.
+    """
+    if not text:
+        return 0
+    pos = name.find(text)
+    if pos == 0:
+        return 3000 - len(name)
+    if pos > 0:
+        word_start = not name[pos - 1].isalnum()
+        return (2500 if word_start else 2000) - pos - len(name)
+
+    # Letters in order with gaps; consecutive and word-start letters count extra
+    score = 1000
+    last = -1
+    for ch in text:
+        pos = name.find(ch, last + 1)
+        if pos < 0:
+            return None
+        if pos == last + 1:
+            score += 10
+        elif pos == 0 or not name[pos - 1].isalnum():
+            score += 5
+        else:
+            score -= pos - last
+        last = pos
+    return score - len(name)
+
+
+def rank_categories(categories, text="", ordering="default", counts=None, last_used=None):
+    """Categories in display order: by ordering, then by match quality to text.
+
+    counts maps a category to how often it was used and last_used to the ISO
+    timestamp of its latest use; categories missing from either sort last.
+    """
+    ranked = list(categories)
+    if ordering == "frequent" and counts:
+        ranked.sort(key=lambda c: counts.get(c, 0), reverse=True)
+    elif ordering == "recent" and last_used:
+        ranked.sort(key=lambda c: last_used.get(c, ""), reverse=True)
+
+    text = text.strip().lower()
+    if not text:
+        return ranked
+    scored = []
+    for category in ranked:
+        score = fuzzy_score(text, category.lower())
+        if score is not None:
+            scored.append((score, category))
+    scored.sort(key=lambda item: item[0], reverse=True)  # stable: ties keep the ordering
+    return [category for _, category in scored]
@@ -0,0 +1,286 @@
+"""Image sources: plain folders and zip/tar archives read in place.
+
+Every place that lists, decodes or exports images goes through this module so
+the labelers work the same whether a dataset is a directory or an archive
+shard. Archive members are addressed as ``archive!member`` (see
+``ArchiveMember``); that string is what ends up in the label CSV.
+"""
+
+import io
+import os
+import abc
+import mmap
+import shutil
+import struct
+import tarfile
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+
+from PIL import Image
+
+ARCHIVE_SEPARATOR = "!"
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')
+
+# Size of the fixed part of a zip local file header (PKWARE APPNOTE 4.3.7).
+_ZIP_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+
+
+@dataclass(frozen=True, order=True)
+class ArchiveMember:
+    """A file inside an archive, printed as ``archive!member``."""
+    archive: str
+    member: str
+
+    @property
+    def name(self):
+        return PurePosixPath(self.member).name
+
+    @property
+    def suffix(self):
+        return PurePosixPath(self.member).suffix
+
+    def __str__(self):
+        return f"{self.archive}{ARCHIVE_SEPARATOR}{self.member}"
+
+
+def parse_ref(path_str):
+    """Turns a label path string back into a Path or ArchiveMember."""
+    archive, sep, member = str(path_str).partition(ARCHIVE_SEPARATOR)
+    if sep and member and os.path.isfile(archive):
+        return ArchiveMember(archive, member)
+    return Path(path_str)
+
+
+class ImageSource(abc.ABC):
+    """Base class for a collection of images that can be listed and decoded."""
+    read_only = True
+
+    def __init__(self, location):
+        self.location = str(location)
+
+    @abc.abstractmethod
+    def list_images(self, extensions):
+        """Returns the sorted image references whose suffix is in extensions."""
+
+    @abc.abstractmethod
+    def read_bytes(self, ref):
+        pass
+
+    def open_image(self, ref):
+        return Image.open(io.BytesIO(self.read_bytes(ref)))
+
+    @abc.abstractmethod
+    def exists(self, ref):
+        pass
+
+    @abc.abstractmethod
+    def export(self, ref, dest, move=False):
+        """Writes ref to dest. Archives are read-only, so move copies."""
+
+    def close(self):
+        pass
+
+
+class DirectorySource(ImageSource):
+    """Images sitting directly in a folder (not recursive)."""
+    read_only = False
+
+    def list_images(self, extensions):
+        path = Path(self.location)
+        files = []
+        if path.exists():
+            for f in path.iterdir():
+                if f.is_file() and f.suffix.lower() in extensions:
+                    files.append(f)
+        return sorted(files)
+
+    def read_bytes(self, ref):
+        return Path(ref).read_bytes()
+
+    def open_image(self, ref):
+        return Image.open(ref)
+
+    def exists(self, ref):
+        return Path(ref).exists()
+
+    def export(self, ref, dest, move=False):
+        if move:
+            shutil.move(ref, dest)
+        else:
+            shutil.copy2(ref, dest)
+
+
+class _MappedArchiveSource(ImageSource):
+    """Shared plumbing for archives that are memory-mapped once and indexed."""
+
+    def __init__(self, location):
+        super().__init__(location)
+        self._map = None
+        self.index = {}  # member name -> archive-specific entry
+        self._file = open(self.location, 'rb')
+        try:
+            try:
+                self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Zero-length files cannot be mapped.
+                pass
+            self._build_index()
+        except BaseException:
+            self.close()
+            raise
+
+    @abc.abstractmethod
+    def _build_index(self):
+        """Opens the archive and fills self.index."""
+
+    def _ref(self, member):
+        return ArchiveMember(self.location, member)
+
+    def list_images(self, extensions):
+        return sorted(self._ref(name) for name in self.index
+                      if PurePosixPath(name).suffix.lower() in extensions)
+
+    def exists(self, ref):
+        return ref.member in self.index
+
+    def _open_member(self, ref):
+        """Returns a binary file object positioned at the member's data."""
+        return io.BytesIO(self.read_bytes(ref))
+
+    def export(self, ref, dest, move=False):
+        with self._open_member(ref) as src, open(dest, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+
+class ZipSource(_MappedArchiveSource):
+    """Zip archive. Stored members are sliced straight out of the mapping;
+    deflated ones are inflated through zipfile from the same file handle."""
+
+    _zip = None
+
+    def _build_index(self):
+        self._zip = zipfile.ZipFile(self._file)
+        for info in self._zip.infolist():
+            if not info.is_dir():
+                self.index[info.filename] = info
+
+    def _stored_span(self, info):
+        if info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1 or self._map is None:
+            return None
+        header = _ZIP_LOCAL_HEADER.unpack_from(self._map, info.header_offset)
+        name_len, extra_len = header[-2], header[-1]
+        start = info.header_offset + _ZIP_LOCAL_HEADER.size + name_len + extra_len
+        return start, start + info.file_size
+
+    def read_bytes(self, ref):
+        info = self.index[ref.member]
+        span = self._stored_span(info)
+        if span is not None:
+            return self._map[span[0]:span[1]]
+        return self._zip.read(info)
+
+    def _open_member(self, ref):
+        if self._stored_span(self.index[ref.member]) is not None:
+            return io.BytesIO(self.read_bytes(ref))
+        return self._zip.open(self.index[ref.member])
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+        super().close()
+
+
+class TarSource(_MappedArchiveSource):
+    """Tar archive. Uncompressed tars are read from the mapping by offset;
+    compressed ones fall back to tarfile's streaming reader."""
+
+    _tar = None
+
+    def _build_index(self):
+        if self._map is not None:
+            try:
+                self._tar = tarfile.open(fileobj=self._map, mode='r:')
+                self._mapped = True
+            except tarfile.ReadError:
+                self._tar = None
+        if self._tar is None:
+            self._tar = tarfile.open(self.location, mode='r:*')
+            self._mapped = False
+        for info in self._tar:
+            if info.isfile():
+                self.index[info.name] = info
+
+    def read_bytes(self, ref):
+        info = self.index[ref.member]
+        if self._mapped:
+            return self._map[info.offset_data:info.offset_data + info.size]
+        with self._tar.extractfile(info) as f:
+            return f.read()
+
+    def _open_member(self, ref):
+        if self._mapped:
+            return io.BytesIO(self.read_bytes(ref))
+        return self._tar.extractfile(self.index[ref.member])
+
+    def close(self):
+        if self._tar is not None:
+            self._tar.close()
+        super().close()
+
+
+# Archive sources are expensive to index, so keep one per archive path.
+_archive_sources = {}
+
+
+def open_source(location):
+    """Returns the ImageSource for a folder or archive path."""
+    location = str(location)
+    if os.path.isdir(location) or not os.path.exists(location):
+        return DirectorySource(location)
+
+    key = os.path.abspath(location)
+    source = _archive_sources.get(key)
+    if source is None:
+        if zipfile.is_zipfile(location):
+            source = ZipSource(location)
+        elif tarfile.is_tarfile(location):
+            source = TarSource(location)
+        else:
+            raise ValueError(f"Not a folder or supported archive: {location}")
+        _archive_sources[key] = source
+    return source
+
+
+def close_sources():
+    """Releases every cached archive mapping."""
+    for source in _archive_sources.values():
+        source.close()
+    _archive_sources.clear()
+
+
+def source_for(ref):
+    """Returns the source that can decode a reference from list_images."""
+    if isinstance(ref, ArchiveMember):
+        return open_source(ref.archive)
+    return DirectorySource(Path(ref).parent)
+
+
+def open_image(ref):
+    """Opens a Path or ArchiveMember as a PIL image."""
+    return source_for(ref).open_image(ref)
+
+
+def image_exists(ref):
+    return source_for(ref).exists(ref)
+
+
+def export_image(ref, dest, move=False):
+    """Copies (or, for plain files, moves) ref to dest, streaming archive data."""
+    source_for(ref).export(ref, dest, move=move)
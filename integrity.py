@@ -0,0 +1,165 @@
+"""Integrity scan: find corrupt and decompression-bomb-sized images up front.
+
+Each image gets a Pillow ``verify()`` plus a full decode in a worker process.
+Results are cached by path together with the file's mtime and size, so a
+rescan only touches files that changed.
+"""
+
+import os
+import json
+import shutil
+import warnings
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+from image_sources import ArchiveMember, open_image, parse_ref
+from pools import iter_completed
+
+OK = "ok"
+CORRUPT = "corrupt"
+OVERSIZED = "oversized"
+QUARANTINE_DIR = "quarantine"
+
+
+def integrity_cache_path(csv_file):
+    """The scan cache lives next to the label file, like the suggestions."""
+    return str(Path(csv_file).with_suffix(".integrity.json"))
+
+
+def file_stamp(ref):
+    """(mtime, size) of the file backing ref; archive members use the archive."""
+    backing = ref.archive if isinstance(ref, ArchiveMember) else ref
+    st = os.stat(backing)
+    return [st.st_mtime, st.st_size]
+
+
+def check_image(path_str):
+    """Returns (status, message) for one image. Runs in worker processes."""
+    ref = parse_ref(path_str)
+    try:
+        with warnings.catch_warnings():
+            # We report size ourselves instead of letting Pillow warn.
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            with open_image(ref) as img:
+                width, height = img.size
+                if Image.MAX_IMAGE_PIXELS and width * height > Image.MAX_IMAGE_PIXELS:
+                    return OVERSIZED, f"{width}x{height} pixels"
+                img.verify()
+            # verify() leaves the image unusable and skips pixel data, so decode again.
+            with open_image(ref) as img:
+                img.load()
+    except Image.DecompressionBombError as e:
+        return OVERSIZED, str(e)
+    except Exception as e:
+        return CORRUPT, str(e) or type(e).__name__
+    return OK, ""
+
+
+def _check_chunk(paths):
+    return [check_image(path_str) for path_str in paths]
+
+
+class IntegrityCache:
+    """Scan results keyed by path, valid while the file's stamp is unchanged."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}  # Map: image_path -> [mtime, size, status, message]
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                print(f"Error loading integrity cache: {e}")
+
+    def get(self, ref, stamp=None):
+        """Returns (status, message) if cached for the file's current stamp."""
+        entry = self.entries.get(str(ref))
+        if entry is None:
+            return None
+        if stamp is None:
+            try:
+                stamp = file_stamp(ref)
+            except OSError:
+                return None
+        if entry[:2] != stamp:
+            return None
+        return entry[2], entry[3]
+
+    def put(self, ref, stamp, status, message):
+        self.entries[str(ref)] = [stamp[0], stamp[1], status, message]
+
+    def save(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+
+
+def iter_scan(image_files, cache, workers=None, chunksize=32, cancel=None):
+    """Checks every image that isn't cached with its current stamp.
+
+    Yields {image_path: (status, message)} for the images that are not OK:
+    first those known from the cache or missing, then each checked chunk as
+    it completes. Setting the cancel event drops the chunks not yet started.
+    The cache is saved when the scan ends, even if interrupted.
+    """
+    problems = {}
+    todo = []
+    for ref in image_files:
+        try:
+            stamp = file_stamp(ref)
+        except OSError as e:
+            problems[str(ref)] = (CORRUPT, str(e))
+            continue
+        cached = cache.get(ref, stamp)
+        if cached is None:
+            todo.append((ref, stamp))
+        elif cached[0] != OK:
+            problems[str(ref)] = cached
+    yield problems
+
+    if todo:
+        context = multiprocessing.get_context("spawn")
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                chunks = {}
+                for i in range(0, len(todo), chunksize):
+                    chunk = todo[i:i + chunksize]
+                    chunks[pool.submit(_check_chunk, [str(ref) for ref, _ in chunk])] = chunk
+                for future in iter_completed(pool, chunks, cancel):
+                    problems = {}
+                    for (ref, stamp), (status, message) in zip(chunks[future], future.result()):
+                        cache.put(ref, stamp, status, message)
+                        if status != OK:
+                            problems[str(ref)] = (status, message)
+                    yield problems
+        finally:
+            cache.save()
+
+
+def scan_images(image_files, cache, workers=None, chunksize=32, cancel=None):
+    """Runs iter_scan to the end. Returns {image_path: (status, message)} for
+    every image that is not OK."""
+    problems = {}
+    for found in iter_scan(image_files, cache, workers, chunksize, cancel):
+        problems.update(found)
+    return problems
+
+
+def known_corrupt(image_files, cache):
+    """Paths already cached as corrupt for their current stamp; no decoding."""
+    bad = {path for path, entry in cache.entries.items() if entry[2] == CORRUPT}
+    if not bad:
+        return set()
+    return {str(ref) for ref in image_files if str(ref) in bad and cache.get(ref) is not None}
+
+
+def quarantine(ref, folder):
+    """Moves a plain image file into folder/quarantine and returns its new path."""
+    quarantine_dir = Path(folder) / QUARANTINE_DIR
+    quarantine_dir.mkdir(exist_ok=True)
+    dest = quarantine_dir / ref.name
+    shutil.move(ref, dest)
+    return dest
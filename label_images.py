@@ -8,6 +8,8 @@
 import os
 import csv
 import sys
+import bisect
+import argparse
 import datetime
 from pathlib import Path
 
@@ -17,24 +19,28 @@ except ImportError:
     print("Error: Pillow is required. Please install it (e.g., 'pip install Pillow') or run with 'uv run'.")
     sys.exit(1)
 
+from image_sources import open_image, open_source
+from integrity import CORRUPT, IntegrityCache, integrity_cache_path, scan_images
+from terminal_preview import PROTOCOLS, PreviewPrefetcher, detect_protocol, read_key
+from shards import POLICIES, merge_labels, parse_shard, report_path, select_shard
+from metadata import FIELDS, MetadataCache, arrange, group_starts, index_metadata, metadata_cache_path
+
 # --- Configuration ---
 IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tiff'}
 DEFAULT_CATEGORIES = ["cat", "dog", "car", "person", "other"]
 OUTPUT_FILE = "labels.csv"
 IMAGE_FOLDER = "images"
+PREVIEW = "auto"  # "auto", "kitty", "sixel", "blocks" or "viewer" (external OS viewer)
+PREFETCH = 3  # Images rendered ahead while you choose
 
 def get_image_files(folder):
-    """Scans the folder for image files with supported extensions."""
+    """Scans the folder (or zip/tar archive) for image files with supported extensions."""
     path = Path(folder)
     if not path.exists():
         print(f"Warning: Folder '{folder}' does not exist.")
         return []
     
-    files = []
-    for f in path.iterdir():
-        if f.is_file() and f.suffix.lower() in IMAGE_EXTENSIONS:
-            files.append(f)
-    return sorted(files)
+    return open_source(folder).list_images(IMAGE_EXTENSIONS)
 
 def load_existing_labels(csv_file):
     """Loads already labeled image paths from the CSV file."""
@@ -65,18 +71,75 @@ def append_label(csv_file, image_path, category):
         
         writer.writerow([str(image_path), category, datetime.datetime.now().isoformat()])
 
+def merge(label_files, output, policy, roots=None):
+    """Combines the label files of several labelers into one."""
+    print(f"Merging {len(label_files)} label files into {output} ...")
+    stats = merge_labels(label_files, output, policy, roots=roots)
+    print(f"Read {stats['rows']} labels for {stats['images']} images.")
+    if stats['bad_rows']:
+        reason = "without an image path and category" + (" or outside their --root" if roots else "")
+        print(f"Warning: skipped {stats['bad_rows']} rows {reason}.")
+    print(f"{stats['conflicts']} images were labeled in more than one file, "
+          f"{stats['disagreements']} with different categories (resolved by '{policy}').")
+    if stats['disagreements']:
+        print(f"Disagreements written to {report_path(output)}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Label images into categories from the terminal.")
+    parser.add_argument("--shard", type=parse_shard, metavar="i/N",
+                        help="label only slice i of N of the folder, e.g. 2/4")
+    parser.add_argument("--sort", choices=FIELDS, default="name",
+                        help="order images by file name, capture time, camera or size (default: name)")
+    parser.add_argument("--merge", nargs="+", metavar="LABEL_FILE",
+                        help="merge these label files into --output instead of labeling")
+    parser.add_argument("--output", help=f"label file (default: {OUTPUT_FILE}; required with --merge)")
+    parser.add_argument("--policy", choices=POLICIES, default="latest",
+                        help="how --merge resolves disagreements (default: latest)")
+    parser.add_argument("--root", action="append", metavar="FOLDER",
+                        help="folder the --merge label paths are under, once for all files or once per "
+                             "file in order; paths are merged relative to it")
+    args = parser.parse_args()
+    if args.merge and not args.output:
+        # Never default a merge onto the label file we'd otherwise be appending to
+        parser.error("--merge needs an explicit --output file")
+    if args.root:
+        if not args.merge:
+            parser.error("--root only applies to --merge")
+        if len(args.root) == 1:
+            args.root = args.root * len(args.merge)
+        elif len(args.root) != len(args.merge):
+            parser.error("give --root once, or once per --merge file")
+    return args
+
 def main():
+    args = parse_args()
+    if args.merge:
+        merge(args.merge, args.output, args.policy, args.root)
+        return
+    output_file = args.output or OUTPUT_FILE
+
     print(f"--- Image Labeler ---")
     print(f"Scanning folder: {IMAGE_FOLDER}")
-    print(f"Saving to: {OUTPUT_FILE}")
+    if args.shard:
+        print(f"Shard: {args.shard[0]} of {args.shard[1]}")
+    print(f"Saving to: {output_file}")
     print("Press Ctrl+C to exit safely.\n")
 
-    labeled_images = load_existing_labels(OUTPUT_FILE)
+    labeled_images = load_existing_labels(output_file)
     all_images = get_image_files(IMAGE_FOLDER)
+    if args.shard:
+        all_images = select_shard(all_images, IMAGE_FOLDER, args.shard)
     
     images_to_process = [img for img in all_images if str(img) not in labeled_images]
     
-    total = len(all_images)
+    # Check the images still to label up front so broken files never reach the prompt
+    problems = scan_images(images_to_process, IntegrityCache(integrity_cache_path(output_file)))
+    for path, (status, message) in sorted(problems.items()):
+        print(f"Warning: {status} image {path}: {message}")
+    corrupt = {path for path, (status, _) in problems.items() if status == CORRUPT}
+    images_to_process = [img for img in images_to_process if str(img) not in corrupt]
+    
+    total = len(all_images) - len(corrupt)
     remaining = len(images_to_process)
     skipped = total - remaining
     
@@ -86,34 +149,74 @@ def main():
         print("All images labeled! Exiting.")
         return
 
+    # Sort by image metadata; neighbours that belong together (bursts) form groups
+    starts = list(range(remaining))
+    if args.sort != "name":
+        print(f"Reading image metadata to sort by {args.sort}...")
+        cache = MetadataCache(metadata_cache_path(output_file))
+        index_metadata(images_to_process, cache)
+        images_to_process = arrange(images_to_process, cache.record, args.sort)
+        starts = group_starts(images_to_process, cache.record, args.sort)
+        print(f"{len(starts)} groups.\n")
+
+    # Draw previews in the terminal when it can show them, else use the OS viewer
+    protocol = PREVIEW if PREVIEW in PROTOCOLS else None
+    if PREVIEW == "auto":
+        protocol = detect_protocol()
+    prefetcher = PreviewPrefetcher(images_to_process, protocol, PREFETCH) if protocol else None
+    # One keypress picks a category when every choice is a single key
+    single_key = sys.stdin.isatty() and len(DEFAULT_CATEGORIES) <= 9
+
+    skip_until = 0 # End of a group labeled in one go
     try:
         for i, img_path in enumerate(images_to_process):
+            if i < skip_until:
+                continue
             print(f"[{i+1}/{remaining}] processing: {img_path}")
+            g = bisect.bisect_right(starts, i)
+            group_start = starts[g - 1]
+            group_end = starts[g] if g < len(starts) else remaining
+            if group_end - group_start > 1:
+                print(f"Group: image {i - group_start + 1} of {group_end - group_start}")
             
             # Show image
             try:
-                with Image.open(img_path) as img:
-                    # Show image using the default OS viewer
-                    img.show()
+                if prefetcher:
+                    sys.stdout.write(prefetcher.get(i))
+                    sys.stdout.flush()
+                else:
+                    with open_image(img_path) as img:
+                        # Show image using the default OS viewer
+                        img.show()
             except Exception as e:
                 print(f"Error opening image {img_path}: {e}")
                 continue
 
             # Prompt user
+            whole_group = False
             while True:
                 print("Categories:")
                 for idx, cat in enumerate(DEFAULT_CATEGORIES):
                     print(f"  {idx + 1}. {cat}")
                 print("  c. Custom category")
+                if group_end - i > 1 and not whole_group:
+                    print(f"  g. Apply the next choice to the {group_end - i} remaining images of this group")
                 print("  s. Skip")
                 
-                choice = input("Select category: ").strip().lower()
+                if single_key:
+                    choice = read_key("Select category: ").lower()
+                else:
+                    choice = input("Select category: ").strip().lower()
                 
                 selected_category = None
                 
                 if choice == 's':
                     print("Skipping...")
                     break # Break inner loop to go to next image
+
+                if choice == 'g' and group_end - i > 1:
+                    whole_group = True
+                    continue
                 
                 if choice == 'c':
                     custom = input("Enter custom category: ").strip()
@@ -138,8 +241,14 @@ def main():
                         continue
                 
                 if selected_category:
-                    append_label(OUTPUT_FILE, img_path, selected_category)
-                    print(f"Saved: {selected_category}")
+                    if whole_group:
+                        for path in images_to_process[i:group_end]:
+                            append_label(output_file, path, selected_category)
+                        skip_until = group_end
+                        print(f"Saved: {selected_category} for {group_end - i} images")
+                    else:
+                        append_label(output_file, img_path, selected_category)
+                        print(f"Saved: {selected_category}")
                     break
             
             print("-" * 20)
@@ -147,6 +256,9 @@ def main():
     except KeyboardInterrupt:
         print("\n\nProcess interrupted by user. Progress saved.")
         sys.exit(0)
+    finally:
+        if prefetcher:
+            prefetcher.close()
 
     print("Done scanning images.")
 
@@ -12,14 +12,33 @@ import os
 import csv
 import json
 import sys
+import argparse
+import queue
+import multiprocessing
 import shutil
+import threading
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import customtkinter as ctk
-from PIL import Image, ImageTk
 import pillow_heif
 import datetime
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
+from image_sources import (ARCHIVE_EXTENSIONS, ARCHIVE_SEPARATOR, ArchiveMember, export_image,
+                           image_exists, open_image, open_source, parse_ref)
+from integrity import (CORRUPT, OVERSIZED, IntegrityCache, integrity_cache_path, iter_scan, known_corrupt,
+                       quarantine)
+from project import Project
+from snapshot import read_snapshot, write_snapshot
+from query import LabelIndex, parse_query
+from shards import parse_shard, select_shard
+from metadata import (FIELDS, MetadataCache, arrange, group_bounds, index_metadata,
+                      metadata_cache_path)
+from categories import ORDERINGS, rank_categories
+from tiles import DiskPyramid, MemoryPyramid, TileViewer, build_pyramid, pyramid_dir, should_tile
+from prelabel import (DEFAULT_MODEL, DEFAULT_THRESHOLD, SuggestionCache, run_prelabel,
+                      suggestion_cache_path)
 
 # Register HEIC opener
 pillow_heif.register_heif_opener()
@@ -28,31 +47,584 @@ pillow_heif.register_heif_opener()
 DEFAULT_CATEGORIES = ["cat", "dog", "car", "person", "other"]
 IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp', '.tiff', '.heic', '.heif'}
 CONFIG_FILE = "config.json"
+ZOOM_STEP = 1.25
+MAX_ROOT_STATES = 4  # project roots kept loaded in memory; others reopen from their snapshot
+CATEGORY_ROW_HEIGHT = 50  # button height plus padding in the category panel
+CATEGORY_HOTKEYS = 9  # the top categories get number keys 1-9
 DEFAULT_THEME = "dark-blue"  # Themes: "blue" (standard), "green", "dark-blue"
 ctk.set_appearance_mode("System")  # Modes: "System" (standard), "Dark", "Light"
 ctk.set_default_color_theme(DEFAULT_THEME)
 
-class ImageLabelerApp(ctk.CTk):
-    def __init__(self):
-        super().__init__()
-
-        self.title("Gemini Image Labeler")
-        self.geometry("1100x750")
+class LabelSession:
+    """Labeling state and file handling, kept separate from the widgets."""
 
-        # Data State
+    def __init__(self):
         self.image_folder = ""
+        self.source = None
         self.all_image_files = []
         self.image_files = []
         self.current_index = 0
         self.labels = {}  # Map: image_path -> category
+        self.label_times = {}  # Map: image_path -> ISO timestamp of its label
+        self.query = None  # Query narrowing the view, on top of hide_labeled
         self.categories = list(DEFAULT_CATEGORIES)
+        self.category_order = "default"  # One of categories.ORDERINGS
         self.csv_file = "image_labels.csv"
-        self.hide_labeled_var = tk.BooleanVar(value=True)
+        self.hide_labeled = True
         self.history = [] # Stack for undo: list of (image_path, label)
         self.current_rotation = 0
+        self.prelabel_model = DEFAULT_MODEL
+        self.prelabel_threshold = DEFAULT_THRESHOLD
+        self.suggestions = None  # SuggestionCache for the current label file
+        self.integrity = None  # IntegrityCache for the current label file
+        self.project = None
+        self.project_file = ""
+        self.project_root = None  # Path of the root being labeled
+        self._root_states = OrderedDict()  # Map: root path -> state kept from a recent visit
+        self._before_project = ("", "")  # (image folder, label file) to return to on close
+        self.shard = None  # (i, N) to label only slice i of N of every folder
+        self.sort_by = "name"  # One of metadata.FIELDS
+        self.metadata = None  # MetadataCache for the current label file
+        self.reindex()
+
+    def current_file(self):
+        if 0 <= self.current_index < len(self.image_files):
+            return self.image_files[self.current_index]
+        return None
+
+    def open_folder(self, folder, resume=False):
+        """Loads a folder's files and labels together and resolves the view once.
+
+        The folder scan and the CSV parse run side by side. With resume, a
+        valid snapshot replaces both and restores the last position. If folder
+        can't be opened the session keeps its previous folder and files.
+        """
+        previous = self.image_folder
+        self.image_folder = folder
+        try:
+            if resume and self.restore_snapshot():
+                return
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                scan = pool.submit(self._scan_folder, folder)
+                labels = pool.submit(self._read_labels)
+                self.source, self.all_image_files = scan.result()
+                self.labels, self.label_times = labels.result()
+        except Exception:
+            self.image_folder = previous
+            raise
+        self.load_suggestions()
+        self.reindex()
+        self.apply_filter()
+
+    def load_images_from_folder(self, folder):
+        """Loads a folder or a zip/tar archive through its image source."""
+        self.image_folder = folder
+        self.source, self.all_image_files = self._scan_folder(folder)
+        self.reindex()
+        self.apply_filter()
+
+    def _scan_folder(self, folder):
+        source = None
+        files = []
+        if os.path.exists(folder):
+            source = open_source(folder)
+            files = source.list_images(IMAGE_EXTENSIONS)
+            # Files an earlier scan found corrupt stay hidden until they change.
+            bad = known_corrupt(files, self.integrity_cache())
+            if bad:
+                files = [f for f in files if str(f) not in bad]
+            if self.shard is not None:
+                files = select_shard(files, folder, self.shard)
+        return source, files
+
+    def save_snapshot(self):
+        if not self.image_folder:
+            return
+        current = self.current_file()
+        write_snapshot(self.csv_file, self.image_folder, {
+            'labels': self.labels,
+            'label_times': self.label_times,
+            'files': [str(f) for f in self.all_image_files],
+            'current_file': str(current) if current is not None else None,
+            'current_index': self.current_index,
+            'shard': list(self.shard) if self.shard is not None else None,
+        })
+
+    def restore_snapshot(self):
+        """Restores files, labels and position from a valid snapshot and rebuilds the indexes."""
+        data = read_snapshot(self.csv_file, self.image_folder)
+        shard = tuple(data['shard']) if data is not None and data.get('shard') else None
+        if data is None or shard != self.shard:
+            return False
+        self.source = open_source(self.image_folder)
+        self.labels = data['labels']
+        self.label_times = data['label_times']
+        # Members of an archive are stored as 'archive!member' strings
+        prefix = self.source.location + ARCHIVE_SEPARATOR
+        self.all_image_files = [ArchiveMember(self.source.location, f[len(prefix):]) if f.startswith(prefix)
+                                else Path(f) for f in data['files']]
+        self.load_suggestions()
+        self.reindex()
+        self.apply_filter()
+
+        # Resume on the same image, or the same spot if it has since been hidden
+        for i, f in enumerate(self.image_files):
+            if str(f) == data['current_file']:
+                self.current_index = i
+                break
+        else:
+            self.current_index = min(data['current_index'], max(0, len(self.image_files) - 1))
+        return True
+
+    def reindex(self):
+        """Rebuilds the query indexes after the file list or labels were replaced."""
+        self.index = LabelIndex(self.all_image_files, self.labels, self.label_times, self.image_folder)
+
+    def set_query(self, text):
+        """Parses a filter box query (see query.py) and applies it. Raises
+        ValueError for malformed queries."""
+        query = parse_query(text)
+        self.query = None if query.is_empty() else query
+        self.apply_filter()
+
+    def apply_filter(self):
+        files = self.index.files
+        self.image_files = [files[i] for i in self.index.resolve(self.query, self.hide_labeled)]
+        if self.sort_by != "name":
+            self.image_files = arrange(self.image_files, self.metadata_cache().record, self.sort_by)
+
+        self.current_index = 0
+        self.current_rotation = 0
+
+    def load_labels(self):
+        self.labels, self.label_times = self._read_labels()
+        self.load_suggestions()
+        self.reindex()
+        self.apply_filter()
+
+    def _read_labels(self):
+        labels = {}
+        label_times = {}
+        if os.path.exists(self.csv_file):
+            try:
+                with open(self.csv_file, 'r', newline='', encoding='utf-8') as f:
+                    reader = csv.reader(f)
+                    next(reader, None) # Skip header
+                    for row in reader:
+                        if row:
+                            labels[row[0]] = row[1]
+                            label_times[row[0]] = row[2] if len(row) > 2 else ""
+            except Exception as e:
+                print(f"Error loading labels: {e}")
+        return labels, label_times
+
+    def save_label(self, category):
+        """Records a label for the current image. The view is left as is so the
+        caller decides how to advance."""
+        current = self.current_file()
+        if current is None:
+            return False
+
+        current_file = str(current)
+
+        # Save to history for undo
+        self.history.append({'path': current_file, 'label': category, 'index': self.current_index, 'was_hidden': self.hide_labeled})
+        self.current_rotation = 0 # Reset rotation on save
+        self.append_labels([(current_file, category)])
+        return True
+
+    def append_labels(self, rows):
+        """Stores (image_path, category) pairs and appends them to the CSV."""
+        timestamp = datetime.datetime.now().isoformat()
+        with open(self.csv_file, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            if f.tell() == 0:
+                 writer.writerow(["image_path", "category", "timestamp"])
+            for image_path, category in rows:
+                self.labels[image_path] = category
+                self.label_times[image_path] = timestamp
+                self.index.set_label(image_path, category, timestamp)
+                writer.writerow([image_path, category, timestamp])
+
+    def ranked_categories(self, text=""):
+        """Categories for the panel in the chosen order, narrowed to those matching text."""
+        return rank_categories(self.categories, text, self.category_order,
+                               self.index.counts, self.index.last_used)
+
+    def unlabeled_files(self):
+        files = self.index.files
+        return [files[i] for i in self.index.resolve(None, hide_labeled=True)]
+
+    def load_suggestions(self):
+        self.suggestions = SuggestionCache(suggestion_cache_path(self.csv_file), self.prelabel_model)
+        return self.suggestions
+
+    def current_suggestion(self):
+        """Returns (category, confidence) for the current image, or None."""
+        current = self.current_file()
+        if current is None or self.suggestions is None:
+            return None
+        return self.suggestions.get(current)
+
+    def accept_suggestion(self):
+        suggestion = self.current_suggestion()
+        if suggestion is None:
+            return False
+        return self.save_label(suggestion[0])
+
+    def auto_accept(self, threshold=None):
+        """Labels every unlabeled image whose suggestion is at least threshold
+        confident. Each one can still be undone. Returns how many were labeled."""
+        if self.suggestions is None:
+            return 0
+        if threshold is None:
+            threshold = self.prelabel_threshold
+
+        rows = []
+        for f in self.unlabeled_files():
+            suggestion = self.suggestions.get(f)
+            if suggestion is not None and suggestion[1] >= threshold:
+                rows.append((str(f), suggestion[0]))
+                self.history.append({'path': str(f), 'label': suggestion[0], 'index': None, 'was_hidden': self.hide_labeled})
+        if rows:
+            self.append_labels(rows)
+        return len(rows)
+
+    def drop_current(self):
+        """Removes the current image from the view and clamps the index."""
+        if self.current_index < len(self.image_files):
+            del self.image_files[self.current_index]
+        if self.current_index >= len(self.image_files):
+            self.current_index = max(0, len(self.image_files) - 1)
+
+    def undo(self):
+        """Reverts the last label and returns its image path, or None."""
+        if not self.history:
+            return None
+
+        last_action = self.history.pop()
+        image_path = last_action['path']
+
+        # 1. Remove from local labels dict
+        if image_path in self.labels:
+            del self.labels[image_path]
+            self.label_times.pop(image_path, None)
+            self.index.clear_label(image_path)
+
+        # 2. Remove from CSV (Rewrite file)
+        self.remove_label_from_csv(image_path)
+
+        # 3. Re-apply the filter (which will now see it as unlabeled) and jump to it.
+        self.apply_filter()
+        for i, f in enumerate(self.image_files):
+            if str(f) == image_path:
+                self.current_index = i
+                break
+        return image_path
+
+    def remove_label_from_csv(self, image_path_to_remove):
+        if not os.path.exists(self.csv_file):
+            return
+
+        lines = []
+        with open(self.csv_file, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            try:
+                header = next(reader)
+                lines.append(header)
+                for row in reader:
+                    if row and row[0] != str(image_path_to_remove):
+                        lines.append(row)
+            except StopIteration:
+                pass
+
+        with open(self.csv_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerows(lines)
+
+    def move_to_trash(self):
+        """Moves the current image into a ``trash`` subfolder. Archive members
+        are read-only and cannot be trashed."""
+        current_file = self.current_file()
+        if current_file is None or self.source is None or self.source.read_only:
+            return False
+
+        trash_dir = Path(self.image_folder) / "trash"
+        trash_dir.mkdir(exist_ok=True)
+        shutil.move(current_file, trash_dir / current_file.name)
+
+        # Remove from all lists
+        if current_file in self.all_image_files:
+            self.all_image_files.remove(current_file)
+            self.index.remove(str(current_file))
+        self.drop_current()
+        return True
+
+    def open_project(self, path):
+        """Opens (or creates) a project. No root is loaded until visited."""
+        self.leave_root()
+        if self.project is None:
+            self._before_project = (self.image_folder, self.csv_file)
+        self.project = Project(path)
+        self.project_file = str(path)
+        self.project_root = None
+        self._root_states = OrderedDict()
+        self.project.refresh_stale()
+        self.project.save()
+        self.image_folder = ""
+        self.source = None
+        self.all_image_files = []
+        self.labels = {}
+        self.label_times = {}
+        self.history = []
+        self.reindex()
+        self.apply_filter()
+        return self.project
+
+    def close_project(self):
+        """Leaves the project and reopens the folder and label file used before it."""
+        self.leave_root()
+        self.project = None
+        self.project_file = ""
+        self._root_states = OrderedDict()
+        self.image_folder, self.csv_file = self._before_project
+        self.history = []
+        if self.image_folder and os.path.exists(self.image_folder):
+            self.open_folder(self.image_folder, resume=True)
+        else:
+            self.source = None
+            self.all_image_files = []
+            self.load_labels()
+
+    def remove_root(self, folder):
+        """Takes a root out of the project. Its label shard stays on disk."""
+        if folder == self.project_root:
+            self.project_root = None
+            self.image_folder = ""
+            self.source = None
+            self.all_image_files = []
+            self.labels = {}
+            self.label_times = {}
+            self.history = []
+            self.reindex()
+            self.apply_filter()
+        self._root_states.pop(folder, None)
+        self.project.remove_root(folder)
+        self.project.save()
+
+    def root_summary(self):
+        """(total, labeled, category counts) for the loaded images."""
+        return len(self.all_image_files), self.index.labeled_count(), self.index.category_counts()
+
+    def leave_root(self):
+        """Saves the current root's summary and snapshot, and keeps its state
+        in memory for the MAX_ROOT_STATES most recently left roots."""
+        if self.project is None or self.project_root is None:
+            return
+        self.project.update_summary(self.project_root, *self.root_summary())
+        self.project.save()
+        try:
+            self.save_snapshot()
+        except Exception as e:
+            print(f"Error saving session snapshot: {e}")
+        self._root_states[self.project_root] = {
+            'labels': self.labels,
+            'label_times': self.label_times,
+            'index': self.index,
+            'all_image_files': self.all_image_files,
+            'source': self.source,
+            'history': self.history,
+            'suggestions': self.suggestions,
+        }
+        while len(self._root_states) > MAX_ROOT_STATES:
+            self._root_states.popitem(last=False)
+        self.project_root = None
+
+    def visit_root(self, folder):
+        """Switches to a project root, loading its shard and files on first visit."""
+        root = self.project.add_root(folder)
+        if folder == self.project_root:
+            return
+        self.leave_root()
+        self.csv_file = root["csv_file"]
+        self.image_folder = folder
+        state = self._root_states.pop(folder, None)
+        if state is None:
+            self.history = []
+            self.open_folder(folder, resume=True)
+        else:
+            self.labels = state['labels']
+            self.label_times = state['label_times']
+            self.index = state['index']
+            self.all_image_files = state['all_image_files']
+            self.source = state['source']
+            self.history = state['history']
+            self.suggestions = state['suggestions']
+            self.apply_filter()
+        self.project_root = folder
+        self.project.last_root = folder
+        self.project.update_summary(folder, *self.root_summary())
+        self.project.save()
+
+    def project_progress(self):
+        """(labeled, total) over the whole project, live for the current root."""
+        live = {}
+        if self.project_root is not None:
+            total, labeled, _ = self.root_summary()
+            live[self.project_root] = (labeled, total)
+        return self.project.progress(live)
+
+    def integrity_cache(self):
+        path = integrity_cache_path(self.csv_file)
+        if self.integrity is None or self.integrity.path != path:
+            self.integrity = IntegrityCache(path)
+        return self.integrity
+
+    def metadata_cache(self):
+        path = metadata_cache_path(self.csv_file)
+        if self.metadata is None or self.metadata.path != path:
+            self.metadata = MetadataCache(path)
+        return self.metadata
+
+    def index_metadata(self, workers=None):
+        """Reads header metadata for new or changed images. Returns how many were read."""
+        return index_metadata(self.all_image_files, self.metadata_cache(), workers)
+
+    def current_group(self):
+        """(start, end) in image_files of the group around the current image."""
+        if not self.image_files:
+            return 0, 0
+        return group_bounds(self.image_files, self.current_index, self.metadata_cache().record, self.sort_by)
+
+    def label_group(self, category):
+        """Labels every image in the current group, e.g. a whole burst, then
+        moves past it. Each one can still be undone. Returns how many were labeled."""
+        start, end = self.current_group()
+        rows = [(str(f), category) for f in self.image_files[start:end]]
+        if not rows:
+            return 0
+        for image_path, _ in rows:
+            self.history.append({'path': image_path, 'label': category, 'index': None, 'was_hidden': self.hide_labeled})
+        self.current_rotation = 0
+        self.append_labels(rows)
+        if self.hide_labeled:
+            del self.image_files[start:end]
+            self.current_index = min(start, max(0, len(self.image_files) - 1))
+        else:
+            self.current_index = min(end, len(self.image_files) - 1)
+        return len(rows)
+
+    def drop_corrupt(self, problems, move=False):
+        """Removes images a scan found corrupt from the lists, optionally moving
+        them into a ``quarantine`` subfolder. Returns how many were dropped."""
+        corrupt = {path for path, (status, _) in problems.items() if status == CORRUPT}
+        if not corrupt:
+            return 0
+
+        current = self.current_file()
+        if move and self.source is not None and not self.source.read_only:
+            # Paths may already be gone from the lists after an earlier drop
+            for path in sorted(corrupt):
+                try:
+                    quarantine(Path(path), self.image_folder)
+                except Exception as e:
+                    print(f"Error quarantining {path}: {e}")
+
+        self.all_image_files = [f for f in self.all_image_files if str(f) not in corrupt]
+        for path in corrupt:
+            self.index.remove(path)
+        self.image_files = [f for f in self.image_files if str(f) not in corrupt]
+        if current in self.image_files:
+            self.current_index = self.image_files.index(current)
+        elif self.current_index >= len(self.image_files):
+            self.current_index = max(0, len(self.image_files) - 1)
+        return len(corrupt)
+
+    def organize(self, target_root, is_move):
+        """Copies or moves labeled images into target_root/<category>.
+        Returns (count, skipped, errors)."""
+        count = 0
+        errors = 0
+        skipped = 0
+
+        for img_path_str, category in self.labels.items():
+            img_path = parse_ref(img_path_str)
+            if not image_exists(img_path) and isinstance(img_path, Path):
+                if self.image_folder:
+                    potential_path = Path(self.image_folder) / img_path.name
+                    if potential_path.exists():
+                        img_path = potential_path
+
+            if image_exists(img_path):
+                cat_folder = Path(target_root) / category
+                cat_folder.mkdir(parents=True, exist_ok=True)
+                dest_file = cat_folder / img_path.name
+
+                if dest_file.exists():
+                    skipped += 1
+                    continue
+
+                try:
+                    export_image(img_path, dest_file, move=is_move)
+                    count += 1
+                except Exception as e:
+                    print(f"Error {'moving' if is_move else 'copying'} {img_path}: {e}")
+                    errors += 1
+        return count, skipped, errors
+
+    def labeled_count(self):
+        return self.index.labeled_count()
+
+    def load_config(self):
+        if os.path.exists(CONFIG_FILE):
+            try:
+                with open(CONFIG_FILE, 'r') as f:
+                    data = json.load(f)
+                    self.categories = data.get("categories", DEFAULT_CATEGORIES)
+                    self.image_folder = data.get("last_folder", "")
+                    self.csv_file = data.get("csv_file", "image_labels.csv")
+                    self.prelabel_model = data.get("prelabel_model", DEFAULT_MODEL)
+                    self.prelabel_threshold = data.get("prelabel_threshold", DEFAULT_THRESHOLD)
+                    self.project_file = data.get("project_file", "")
+                    self.category_order = data.get("category_order", "default")
+                    self.sort_by = data.get("sort_by", "name")
+            except:
+                pass
+
+    def save_config(self):
+        # A project's roots and shards come from the project file; keep the
+        # user's own folder and label file for when the project is closed.
+        folder, csv_file = self._before_project if self.project is not None else (self.image_folder, self.csv_file)
+        data = {
+            "categories": self.categories,
+            "last_folder": folder,
+            "csv_file": csv_file,
+            "prelabel_model": self.prelabel_model,
+            "prelabel_threshold": self.prelabel_threshold,
+            "project_file": self.project_file,
+            "category_order": self.category_order,
+            "sort_by": self.sort_by
+        }
+        with open(CONFIG_FILE, 'w') as f:
+            json.dump(data, f)
+
+
+class ImageLabelerApp(ctk.CTk):
+    def __init__(self, shard=None):
+        super().__init__()
+
+        self.title("Gemini Image Labeler")
+        self.geometry("1100x750")
+
+        # Data State
+        self.session = LabelSession()
+        self.session.shard = shard
+        if shard is not None:
+            self.title(f"Gemini Image Labeler (shard {shard[0]}/{shard[1]})")
+        self.hide_labeled_var = tk.BooleanVar(value=self.session.hide_labeled)
 
         # Load Configuration
-        self.load_config()
+        self.session.load_config()
 
         # Layout Configuration
         self.grid_columnconfigure(1, weight=1)
@@ -61,7 +633,7 @@ class ImageLabelerApp(ctk.CTk):
         # --- Sidebar (Left) ---
         self.sidebar_frame = ctk.CTkFrame(self, width=240, corner_radius=0)
         self.sidebar_frame.grid(row=0, column=0, sticky="nsew")
-        self.sidebar_frame.grid_rowconfigure(10, weight=1)
+        self.sidebar_frame.grid_rowconfigure(19, weight=1)
 
         # Logo
         self.logo_label = ctk.CTkLabel(self.sidebar_frame, text="Gemini\nLabeler", 
@@ -89,33 +661,84 @@ class ImageLabelerApp(ctk.CTk):
         self.btn_open_folder = ctk.CTkButton(self.sidebar_frame, text="📂  Open Folder", command=self.select_folder, anchor="w", height=35)
         self.btn_open_folder.grid(row=3, column=0, padx=20, pady=5, sticky="ew")
 
+        self.btn_open_archive = ctk.CTkButton(self.sidebar_frame, text="🗜️  Open Archive", command=self.select_archive,
+                                              anchor="w", height=35, fg_color="transparent", border_width=1, text_color=("gray10", "gray90"))
+        self.btn_open_archive.grid(row=4, column=0, padx=20, pady=5, sticky="ew")
+
+        self.btn_open_project = ctk.CTkButton(self.sidebar_frame, text="🗂️  Open Project", command=self.select_project,
+                                              anchor="w", height=35, fg_color="transparent", border_width=1, text_color=("gray10", "gray90"))
+        self.btn_open_project.grid(row=5, column=0, padx=20, pady=5, sticky="ew")
+
+        # Project roots (only shown while a project is open)
+        self.project_frame = ctk.CTkFrame(self.sidebar_frame, fg_color="transparent")
+        self.project_frame.grid(row=6, column=0, padx=20, pady=5, sticky="ew")
+        self.project_frame.grid_columnconfigure(0, weight=1)
+        self.root_menu = ctk.CTkOptionMenu(self.project_frame, values=[""], command=self.on_root_selected, dynamic_resizing=False)
+        self.root_menu.grid(row=0, column=0, sticky="ew")
+        self.btn_add_root = ctk.CTkButton(self.project_frame, text="+", width=30, command=self.add_project_root)
+        self.btn_add_root.grid(row=0, column=1, padx=(5, 0))
+        self.btn_remove_root = ctk.CTkButton(self.project_frame, text="−", width=30, command=self.remove_project_root)
+        self.btn_remove_root.grid(row=0, column=2, padx=(5, 0))
+        self.btn_close_project = ctk.CTkButton(self.project_frame, text="×", width=30, fg_color="gray50", hover_color="gray40",
+                                               command=self.close_project)
+        self.btn_close_project.grid(row=0, column=3, padx=(5, 0))
+        self.project_frame.grid_remove()
+        self.root_menu_paths = {}  # Map: menu entry -> root path
+
         self.btn_change_csv = ctk.CTkButton(self.sidebar_frame, text="📄  Set Label File", command=self.change_label_file, 
                                             anchor="w", height=35, fg_color="transparent", border_width=1, text_color=("gray10", "gray90"))
-        self.btn_change_csv.grid(row=4, column=0, padx=20, pady=5, sticky="ew")
+        self.btn_change_csv.grid(row=7, column=0, padx=20, pady=5, sticky="ew")
 
         self.btn_organize = ctk.CTkButton(self.sidebar_frame, text="📦  Organize Files", fg_color="#2da44e", hover_color="#2c974b", 
                                           command=self.organize_images, anchor="w", height=35)
-        self.btn_organize.grid(row=5, column=0, padx=20, pady=5, sticky="ew")
+        self.btn_organize.grid(row=8, column=0, padx=20, pady=5, sticky="ew")
+
+        self.btn_prelabel = ctk.CTkButton(self.sidebar_frame, text="🤖  Pre-label", command=self.start_prelabel,
+                                          anchor="w", height=35, fg_color="transparent", border_width=1, text_color=("gray10", "gray90"))
+        self.btn_prelabel.grid(row=9, column=0, padx=20, pady=5, sticky="ew")
+
+        self.btn_auto_accept = ctk.CTkButton(self.sidebar_frame, text="✅  Auto-accept", command=self.auto_accept_suggestions,
+                                             anchor="w", height=35, fg_color="transparent", border_width=1, text_color=("gray10", "gray90"))
+        self.btn_auto_accept.grid(row=10, column=0, padx=20, pady=5, sticky="ew")
+
+        self.btn_check = ctk.CTkButton(self.sidebar_frame, text="🩺  Check Images", command=self.start_integrity_scan,
+                                       anchor="w", height=35, fg_color="transparent", border_width=1, text_color=("gray10", "gray90"))
+        self.btn_check.grid(row=11, column=0, padx=20, pady=5, sticky="ew")
 
         # Settings Group
         self.lbl_settings = ctk.CTkLabel(self.sidebar_frame, text="SETTINGS", anchor="w", font=ctk.CTkFont(size=11, weight="bold"), text_color="gray60")
-        self.lbl_settings.grid(row=6, column=0, padx=25, pady=(25, 5), sticky="ew")
+        self.lbl_settings.grid(row=12, column=0, padx=25, pady=(25, 5), sticky="ew")
 
         self.chk_hide_labeled = ctk.CTkCheckBox(self.sidebar_frame, text="Hide Labeled", variable=self.hide_labeled_var, 
                                                 command=self.apply_filter, font=ctk.CTkFont(size=12))
-        self.chk_hide_labeled.grid(row=7, column=0, padx=25, pady=8, sticky="w")
+        self.chk_hide_labeled.grid(row=13, column=0, padx=25, pady=8, sticky="w")
+
+        self.filter_entry = ctk.CTkEntry(self.sidebar_frame, placeholder_text="Filter: cat:dog since:1h name:cam3_*", height=30)
+        self.filter_entry.grid(row=14, column=0, padx=20, pady=5, sticky="ew")
+        self.filter_entry.bind("<Return>", lambda e: self.apply_query())
+
+        # Sorting by capture time, camera or size keeps bursts together
+        self.sort_menu = ctk.CTkOptionMenu(self.sidebar_frame, values=[f"Sort: {f.capitalize()}" for f in FIELDS],
+                                           command=self.change_sort, height=30)
+        self.sort_menu.set(f"Sort: {self.session.sort_by.capitalize()}")
+        self.sort_menu.grid(row=15, column=0, padx=20, pady=5, sticky="ew")
+
+        self.label_group_var = tk.BooleanVar(value=False)
+        self.chk_label_group = ctk.CTkCheckBox(self.sidebar_frame, text="Label Whole Group", variable=self.label_group_var,
+                                               command=self.update_image_info, font=ctk.CTkFont(size=12))
+        self.chk_label_group.grid(row=16, column=0, padx=25, pady=8, sticky="w")
         
         self.btn_edit_cats = ctk.CTkButton(self.sidebar_frame, text="✏️  Edit Categories", command=self.open_category_editor, 
                                            anchor="w", height=35, fg_color="transparent", border_width=1, text_color=("gray10", "gray90"))
-        self.btn_edit_cats.grid(row=8, column=0, padx=20, pady=5, sticky="ew")
+        self.btn_edit_cats.grid(row=17, column=0, padx=20, pady=5, sticky="ew")
         
         self.appearance_mode_optionemenu = ctk.CTkOptionMenu(self.sidebar_frame, values=["System", "Light", "Dark"], 
                                                              command=self.change_appearance_mode_event)
-        self.appearance_mode_optionemenu.grid(row=9, column=0, padx=20, pady=20, sticky="ew")
+        self.appearance_mode_optionemenu.grid(row=18, column=0, padx=20, pady=20, sticky="ew")
         
         # Info Footer
-        self.lbl_csv_info = ctk.CTkLabel(self.sidebar_frame, text=f"{Path(self.csv_file).name}", font=ctk.CTkFont(size=10), text_color="gray50")
-        self.lbl_csv_info.grid(row=11, column=0, padx=25, pady=(0, 20), sticky="w")
+        self.lbl_csv_info = ctk.CTkLabel(self.sidebar_frame, text=f"{Path(self.session.csv_file).name}", font=ctk.CTkFont(size=10), text_color="gray50")
+        self.lbl_csv_info.grid(row=20, column=0, padx=25, pady=(0, 20), sticky="w")
 
         # --- Main Image Area (Center) ---
         self.image_area_frame = ctk.CTkFrame(self, fg_color=("gray95", "gray10"), corner_radius=0)
@@ -155,6 +778,20 @@ class ImageLabelerApp(ctk.CTk):
         self.image_label = ctk.CTkLabel(self.image_area_frame, text="", corner_radius=0)
         self.image_label.grid(row=1, column=0, sticky="nsew", padx=30, pady=10)
 
+        # Zoomable viewer state (mouse wheel zooms, drag pans, double-click fits)
+        self.viewer = None
+        self.viewer_file = None
+        self._render_pending = False
+        self._drag_origin = None
+        self.tile_pool = None
+        self.pyramid_builds = {}  # Map: pyramid dir -> build future
+        self.image_label.bind("<MouseWheel>", lambda e: self.on_zoom(e, ZOOM_STEP if e.delta > 0 else 1 / ZOOM_STEP))
+        self.image_label.bind("<Button-4>", lambda e: self.on_zoom(e, ZOOM_STEP))
+        self.image_label.bind("<Button-5>", lambda e: self.on_zoom(e, 1 / ZOOM_STEP))
+        self.image_label.bind("<ButtonPress-1>", self.on_drag_start)
+        self.image_label.bind("<B1-Motion>", self.on_drag)
+        self.image_label.bind("<Double-Button-1>", lambda e: self.reset_zoom())
+
         # Navigation Footer
         self.nav_frame = ctk.CTkFrame(self.image_area_frame, fg_color="transparent")
         self.nav_frame.grid(row=2, column=0, sticky="ew", padx=30, pady=(10, 30))
@@ -175,64 +812,238 @@ class ImageLabelerApp(ctk.CTk):
         # --- Right Panel (Categories) ---
         self.cat_outer_frame = ctk.CTkFrame(self, width=280, corner_radius=0)
         self.cat_outer_frame.grid(row=0, column=2, sticky="nsew")
-        self.cat_outer_frame.grid_rowconfigure(1, weight=1)
+        self.cat_outer_frame.grid_rowconfigure(2, weight=1)
         self.cat_outer_frame.grid_columnconfigure(0, weight=1)
         
         self.lbl_cat_title = ctk.CTkLabel(self.cat_outer_frame, text="CATEGORIES", font=ctk.CTkFont(size=13, weight="bold"), anchor="w", text_color="gray60")
         self.lbl_cat_title.grid(row=0, column=0, padx=20, pady=(35, 10), sticky="ew")
 
-        self.cat_frame = ctk.CTkScrollableFrame(self.cat_outer_frame, label_text="", fg_color="transparent")
-        self.cat_frame.grid(row=1, column=0, sticky="nsew", padx=10, pady=0)
+        # Type-ahead search and ordering
+        self.cat_search_frame = ctk.CTkFrame(self.cat_outer_frame, fg_color="transparent")
+        self.cat_search_frame.grid(row=1, column=0, sticky="ew", padx=15, pady=(0, 10))
+        self.cat_search_entry = ctk.CTkEntry(self.cat_search_frame, placeholder_text="Search categories...", height=30)
+        self.cat_search_entry.pack(side="left", fill="x", expand=True, padx=(0, 5))
+        self.cat_search_entry.bind("<KeyRelease>", self.on_category_search)
+        self.cat_search_entry.bind("<Return>", self.on_category_search_return)
+        self.cat_search_entry.bind("<Escape>", self.on_category_search_escape)
+        self.cat_order_menu = ctk.CTkOptionMenu(self.cat_search_frame, values=[o.capitalize() for o in ORDERINGS],
+                                                width=95, height=30, command=self.change_category_order)
+        self.cat_order_menu.set(self.session.category_order.capitalize())
+        self.cat_order_menu.pack(side="right")
+
+        # Virtualized list: a pool of buttons just big enough for the visible
+        # rows is relabeled as the list scrolls or its order changes.
+        self.cat_frame = ctk.CTkFrame(self.cat_outer_frame, fg_color="transparent")
+        self.cat_frame.grid(row=2, column=0, sticky="nsew", padx=10, pady=0)
+        self.cat_frame.grid_rowconfigure(0, weight=1)
+        self.cat_frame.grid_columnconfigure(0, weight=1)
+        self.cat_list = ctk.CTkFrame(self.cat_frame, fg_color="transparent")
+        self.cat_list.grid(row=0, column=0, sticky="nsew")
+        self.cat_list.grid_columnconfigure(0, weight=1)
+        self.cat_list.grid_propagate(False)
+        self.cat_scrollbar = ctk.CTkScrollbar(self.cat_frame, command=self.on_category_scrollbar)
+        self.cat_scrollbar.grid(row=0, column=1, sticky="ns")
+        self.cat_list.bind("<Configure>", self.on_category_resize)
+        self.bind_category_scroll(self.cat_list)
+        self.cat_buttons = []
+        self.cat_button_text = []  # Text each pooled button currently shows
+        self.cat_ranked = []  # Categories in display order for the current search
+        self.cat_first = 0  # Position in cat_ranked of the top visible button
+        self.cat_visible = 1
         
         # Custom input area fixed at bottom
         self.custom_frame = ctk.CTkFrame(self.cat_outer_frame, fg_color="transparent")
-        self.custom_frame.grid(row=2, column=0, sticky="ew", padx=15, pady=20)
+        self.custom_frame.grid(row=3, column=0, sticky="ew", padx=15, pady=20)
         
-        self.cat_buttons = []
+        self.custom_entry = ctk.CTkEntry(self.custom_frame, placeholder_text="New Category...", height=35)
+        self.custom_entry.pack(side="left", fill="x", expand=True, padx=(0, 5))
+        
+        self.btn_custom = ctk.CTkButton(self.custom_frame, text="Add", width=60, height=35, 
+                                        fg_color="transparent", border_width=1,
+                                        command=self.save_custom_category)
+        self.btn_custom.pack(side="right")
         
         # Keyboard Bindings
-        self.bind("<Left>", lambda e: self.prev_image())
-        self.bind("<Right>", lambda e: self.next_image())
+        self.bind("<Left>", lambda e: self.on_arrow_key(-1))
+        self.bind("<Right>", lambda e: self.on_arrow_key(1))
         self.bind("<Control-z>", lambda e: self.undo_last_action())
+        self.bind("<Return>", lambda e: self.accept_suggestion())
+        for n in range(1, CATEGORY_HOTKEYS + 1):
+            self.bind(f"<KeyPress-{n}>", lambda e, i=n - 1: self.on_category_hotkey(i))
 
-        # Startup
-        if self.image_folder and os.path.isdir(self.image_folder):
-            self.load_images_from_folder(self.image_folder)
-        elif os.path.isdir("images"):
-            self.load_images_from_folder("images")
-        
-        self.load_labels()
-        self.refresh_category_buttons()
+        self.prelabel_queue = queue.Queue()
+        self.prelabel_thread = None
+        self.cancel_event = threading.Event()  # Set on close to stop background pools
+        self.scan_queue = queue.Queue()
+        self.scan_thread = None
+        self.scan_report = False  # Show a summary when the running scan ends
+        self.scan_found = {}  # Problems found by the running scan
+        self.metadata_queue = queue.Queue()
+        self.metadata_thread = None
+
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # Startup: scan, label load and first render each happen once
+        if self.session.project_file and os.path.exists(self.session.project_file):
+            self.open_project(self.session.project_file)
+        else:
+            folder = self.session.image_folder
+            if not (folder and os.path.exists(folder)):
+                folder = "images" if os.path.isdir("images") else None
+            opened = False
+            if folder is not None:
+                try:
+                    self.session.open_folder(folder, resume=True)
+                    opened = True
+                except Exception as e:
+                    # e.g. a file that isn't an archive; don't let it block every launch
+                    print(f"Could not open {folder}: {e}")
+                    self.session.image_folder = ""
+            if not opened:
+                self.session.load_labels()
+            self.refresh_view()
+        self.start_metadata_index()
+        self.start_integrity_scan(report=False)
 
 
     def select_folder(self):
         folder = filedialog.askdirectory()
         if folder:
-            self.image_folder = folder
-            self.save_config()
-            self.load_labels()
-            self.load_images_from_folder(folder)
+            self.open_location(folder)
+
+    def select_archive(self):
+        patterns = " ".join(f"*{ext}" for ext in ARCHIVE_EXTENSIONS)
+        archive = filedialog.askopenfilename(filetypes=[("Image archives", patterns), ("All files", "*.*")])
+        if archive:
+            self.open_location(archive)
+
+    def open_location(self, location):
+        if self.session.project is not None:
+            self.visit_root(location)
+            return
+        try:
+            self.session.open_folder(location)
+            self.session.save_config()
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not open {location}:\n{e}")
+        self.refresh_view()
+        self.start_metadata_index()
+        self.start_integrity_scan(report=False)
+
+    def select_project(self):
+        path = filedialog.asksaveasfilename(title="Open or Create Project", defaultextension=".json",
+                                            filetypes=[("Label projects", "*.json"), ("All files", "*.*")],
+                                            confirmoverwrite=False)
+        if path:
+            try:
+                self.open_project(path)
+            except Exception as e:
+                messagebox.showerror("Error", f"Could not open project {path}:\n{e}")
+
+    def open_project(self, path):
+        session = self.session
+        project = session.open_project(path)
+        session.save_config()
+        self.project_frame.grid()
+        self.lbl_csv_info.configure(text=Path(path).name)
+        last_root = project.last_root
+        if last_root and project.find_root(last_root) is not None and os.path.exists(last_root):
+            self.visit_root(last_root)
+        else:
+            self.refresh_project_menu()
+            self.refresh_view()
+
+    def close_project(self):
+        self.session.close_project()
+        self.session.save_config()
+        self.project_frame.grid_remove()
+        self.lbl_csv_info.configure(text=Path(self.session.csv_file).name)
+        self.refresh_view()
+        self.start_metadata_index()
+        self.start_integrity_scan(report=False)
+
+    def add_project_root(self):
+        folder = filedialog.askdirectory(title="Add Folder to Project")
+        if folder:
+            self.visit_root(folder)
+
+    def remove_project_root(self):
+        folder = self.root_menu_paths.get(self.root_menu.get())
+        if not folder:
+            return
+        if messagebox.askyesno("Remove Folder", f"Remove {Path(folder).name} from the project?\nIts label file is kept."):
+            self.session.remove_root(folder)
+            self.refresh_project_menu()
+            self.refresh_view()
+
+    def visit_root(self, folder):
+        try:
+            self.session.visit_root(folder)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not open {folder}:\n{e}")
+        self.start_metadata_index()
+        self.start_integrity_scan(report=False)
+        self.refresh_project_menu()
+        self.refresh_view()
+
+    def on_root_selected(self, choice):
+        folder = self.root_menu_paths.get(choice)
+        if folder:
+            self.visit_root(folder)
+
+    def refresh_project_menu(self):
+        session = self.session
+        self.root_menu_paths = {}
+        current = ""
+        for root in session.project.roots:
+            summary = root["summary"]
+            progress = f"{summary['labeled']}/{summary['total']}" if summary else "not opened"
+            entry = f"{Path(root['path']).name}  ({progress})"
+            self.root_menu_paths[entry] = root["path"]
+            if root["path"] == session.project_root:
+                current = entry
+        self.root_menu.configure(values=list(self.root_menu_paths) or [""])
+        self.root_menu.set(current or "Select a folder...")
+
+    def on_close(self):
+        session = self.session
+        if session.project_root is not None:
+            session.leave_root()  # Also saves the root's snapshot
+        else:
+            try:
+                session.save_snapshot()
+            except Exception as e:
+                print(f"Error saving session snapshot: {e}")
+        # Drop queued pool work; only the items already running still finish
+        self.cancel_event.set()
+        if self.tile_pool is not None:
+            self.tile_pool.shutdown(wait=False, cancel_futures=True)
+        self.destroy()
 
     def change_label_file(self):
+        csv_file = self.session.csv_file
         file_path = filedialog.asksaveasfilename(
             defaultextension=".csv",
             filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
-            initialfile=os.path.basename(self.csv_file),
-            initialdir=os.path.dirname(self.csv_file) if os.path.dirname(self.csv_file) else "."
+            initialfile=os.path.basename(csv_file),
+            initialdir=os.path.dirname(csv_file) if os.path.dirname(csv_file) else "."
         )
         if file_path:
-            self.csv_file = file_path
-            self.lbl_csv_info.configure(text=f"{Path(self.csv_file).name}")
-            self.save_config()
+            self.session.csv_file = file_path
+            if self.session.project_root is not None:
+                self.session.project.find_root(self.session.project_root)["csv_file"] = file_path
+                self.session.project.save()
+            self.lbl_csv_info.configure(text=f"{Path(file_path).name}")
+            self.session.save_config()
             self.load_labels()
-            self.display_current_image()
 
     def organize_images(self):
-        if not self.labels:
+        if not self.session.labels:
             messagebox.showinfo("Info", "No labels found to organize.")
             return
 
-        initial_dir = self.image_folder if self.image_folder else "."
+        image_folder = self.session.image_folder
+        initial_dir = image_folder if os.path.isdir(image_folder) else os.path.dirname(image_folder) or "."
         dest_parent = filedialog.askdirectory(title="Select Parent Directory for Organized Folders", initialdir=initial_dir)
         
         if not dest_parent:
@@ -248,218 +1059,296 @@ class ImageLabelerApp(ctk.CTk):
         is_move = messagebox.askyesno("Copy or Move?", 
                                       f"Do you want to MOVE the files to:\n{target_root}\n\n"
                                       "Click 'Yes' to MOVE (originals deleted).\n"
-                                      "Click 'No' to COPY (originals kept).")
+                                      "Click 'No' to COPY (originals kept).\n\n"
+                                      "Images inside archives are always copied.")
         
         action_verb = "Moving" if is_move else "Copying"
-        count = 0
-        errors = 0
-        skipped = 0
-        
-        for img_path_str, category in self.labels.items():
-            img_path = Path(img_path_str)
-            if not img_path.exists():
-                if self.image_folder:
-                    potential_path = Path(self.image_folder) / img_path.name
-                    if potential_path.exists():
-                        img_path = potential_path
-            
-            if img_path.exists():
-                cat_folder = target_root / category
-                cat_folder.mkdir(parents=True, exist_ok=True)
-                dest_file = cat_folder / img_path.name
-                
-                if dest_file.exists():
-                    skipped += 1
-                    continue
-
-                try:
-                    if is_move:
-                        shutil.move(img_path, dest_file)
-                    else:
-                        shutil.copy2(img_path, dest_file)
-                    count += 1
-                except Exception as e:
-                    print(f"Error {action_verb.lower()} {img_path}: {e}")
-                    errors += 1
+        count, skipped, errors = self.session.organize(target_root, is_move)
         
         msg = f"Organization complete.\n{action_verb}: {count} images.\nSkipped (already exists): {skipped}"
         if errors > 0:
             msg += f"\nErrors: {errors}"
         messagebox.showinfo("Done", msg)
         
-        if is_move and self.image_folder:
-             self.load_images_from_folder(self.image_folder)
+        if is_move and image_folder:
+             self.load_images_from_folder(image_folder)
 
     def load_images_from_folder(self, folder):
-        self.image_folder = folder
-        path = Path(folder)
-        self.all_image_files = []
-        if path.exists():
-            for f in path.iterdir():
-                if f.is_file() and f.suffix.lower() in IMAGE_EXTENSIONS:
-                    self.all_image_files.append(f)
-            self.all_image_files.sort()
-        
-        self.apply_filter()
+        self.session.load_images_from_folder(folder)
+        self.refresh_view()
 
     def apply_filter(self):
-        if self.hide_labeled_var.get():
-             self.image_files = [f for f in self.all_image_files if str(f) not in self.labels]
-        else:
-             self.image_files = list(self.all_image_files)
-        
-        self.current_index = 0
-        self.current_rotation = 0
+        self.session.hide_labeled = self.hide_labeled_var.get()
+        self.session.apply_filter()
+        self.refresh_view()
+
+    def apply_query(self):
+        try:
+            self.session.set_query(self.filter_entry.get())
+        except ValueError as e:
+            messagebox.showerror("Filter", str(e))
+            return
+        self.refresh_view()
+
+    def refresh_view(self):
         self.update_status()
         self.display_current_image()
+        self.refresh_category_buttons()
 
     def load_labels(self):
-        self.labels = {}
-        if os.path.exists(self.csv_file):
-            try:
-                with open(self.csv_file, 'r', newline='', encoding='utf-8') as f:
-                    reader = csv.reader(f)
-                    next(reader, None) # Skip header
-                    for row in reader:
-                        if row:
-                            self.labels[row[0]] = row[1]
-            except Exception as e:
-                print(f"Error loading labels: {e}")
-        self.apply_filter()
+        self.session.load_labels()
+        self.refresh_view()
 
     def save_label(self, category):
-        if not self.image_files:
+        session = self.session
+        if self.label_group_var.get() and session.sort_by != "name":
+            if session.label_group(category):
+                self.refresh_view()
+            return
+        if not session.save_label(category):
             return
 
-        current_file = str(self.image_files[self.current_index])
-        
-        # Save to history for undo
-        self.history.append({'path': current_file, 'label': category, 'index': self.current_index, 'was_hidden': self.hide_labeled_var.get()})
-        
-        self.labels[current_file] = category
-        self.current_rotation = 0 # Reset rotation on save
-        
-        with open(self.csv_file, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            if f.tell() == 0:
-                 writer.writerow(["image_path", "category", "timestamp"])
-            writer.writerow([current_file, category, datetime.datetime.now().isoformat()])
-        
-        self.refresh_category_buttons() 
-
-        if self.hide_labeled_var.get():
-            if self.current_index < len(self.image_files):
-                del self.image_files[self.current_index]
+        if session.hide_labeled:
+            session.drop_current()
             
-            if not self.image_files:
-                self.update_status()
-                self.display_current_image()
+            if not session.image_files:
+                self.refresh_view()
                 messagebox.showinfo("All Done", "All images in this folder have been labeled!")
                 return
 
-            if self.current_index >= len(self.image_files):
-                 self.current_index = max(0, len(self.image_files) - 1)
-            
-            self.update_status()
-            self.display_current_image()
+            self.refresh_view()
         else:
             self.next_image()
             self.update_status()
+            self.refresh_category_buttons()
 
     def undo_last_action(self):
-        if not self.history:
+        if self.session.undo() is None:
             messagebox.showinfo("Undo", "Nothing to undo!")
             return
             
-        last_action = self.history.pop()
-        image_path = last_action['path']
-        
-        # 1. Remove from local labels dict
-        if image_path in self.labels:
-            del self.labels[image_path]
-            
-        # 2. Remove from CSV (Rewrite file)
-        self.remove_label_from_csv(image_path)
-        
-        # 3. Restore to view if it was hidden
-        # We need to add it back to self.image_files. 
-        # Ideally we want it at the same position, or we can just append and sort? 
-        # Or simpler: Re-apply filter (which will now see it as unlabeled) and find it.
-        # Re-applying filter is robust but resets index. Let's try to be smart.
-        
-        self.apply_filter() # This puts the image back in self.image_files because we removed it from self.labels
-        
-        # 4. Find the image index to jump to it
-        try:
-            # We want to jump back to the image we just undid
-            path_obj = Path(image_path)
-            # Find index in current image_files
-            for i, f in enumerate(self.image_files):
-                if str(f) == str(path_obj):
-                    self.current_index = i
-                    break
-        except:
-            pass
-            
         self.display_current_image()
         self.update_status()
+        self.refresh_category_buttons()
 
-    def remove_label_from_csv(self, image_path_to_remove):
-        if not os.path.exists(self.csv_file):
+    def accept_suggestion(self):
+        if isinstance(self.focus_get(), tk.Entry):
+            return  # Enter belongs to the text field
+        suggestion = self.session.current_suggestion()
+        if suggestion is not None:
+            self.save_label(suggestion[0])
+
+    def auto_accept_suggestions(self):
+        session = self.session
+        dialog = ctk.CTkInputDialog(text=f"Label all images with confidence at least (0-1):\n(current: {session.prelabel_threshold})",
+                                    title="Auto-accept")
+        value = dialog.get_input()
+        if not value:
             return
-            
-        lines = []
-        with open(self.csv_file, 'r', newline='', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            try:
-                header = next(reader)
-                lines.append(header)
-                for row in reader:
-                    if row and row[0] != str(image_path_to_remove):
-                        lines.append(row)
-            except StopIteration:
-                pass
-                
-        with open(self.csv_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerows(lines)
+        try:
+            threshold = float(value)
+        except ValueError:
+            messagebox.showerror("Error", f"Not a number: {value}")
+            return
+        session.prelabel_threshold = threshold
+        session.save_config()
+        accepted = session.auto_accept(threshold)
+        self.apply_filter()
+        messagebox.showinfo("Auto-accept", f"Accepted {accepted} suggestions.")
 
-    def move_to_trash(self):
-        if not self.image_files:
+    def start_prelabel(self):
+        session = self.session
+        if self.prelabel_thread is not None and self.prelabel_thread.is_alive():
+            messagebox.showinfo("Pre-label", "Pre-labeling is already running.")
             return
-            
-        current_file = self.image_files[self.current_index]
-        trash_dir = Path(self.image_folder) / "trash"
-        trash_dir.mkdir(exist_ok=True)
-        
+        todo = session.unlabeled_files()
+        if not todo:
+            messagebox.showinfo("Pre-label", "No unlabeled images to pre-label.")
+            return
+
+        # Workers only see the file list and categories; suggestions come back via the queue.
+        cache = session.suggestions
+        categories = list(session.categories)
+        self.btn_prelabel.configure(text="🤖  Pre-labeling...", state="disabled")
+        self.prelabel_thread = threading.Thread(target=self._run_prelabel, args=(todo, categories, cache, session.prelabel_model),
+                                                daemon=True)
+        self.prelabel_thread.start()
+        self.after(200, self._poll_prelabel)
+
+    def _run_prelabel(self, todo, categories, cache, model):
         try:
-            dest = trash_dir / current_file.name
-            shutil.move(current_file, dest)
-            
-            # Remove from all lists
-            if current_file in self.all_image_files:
-                self.all_image_files.remove(current_file)
-            
-            # Remove from current view
-            del self.image_files[self.current_index]
-            
-            # Reset index if out of bounds
-            if self.current_index >= len(self.image_files):
-                self.current_index = max(0, len(self.image_files) - 1)
-                
-            self.display_current_image()
-            self.update_status()
-            
+            for results in run_prelabel(todo, categories, cache, model=model, cancel=self.cancel_event):
+                self.prelabel_queue.put(("batch", len(results)))
+            self.prelabel_queue.put(("done", None))
+        except Exception as e:
+            self.prelabel_queue.put(("error", e))
+
+    def _poll_prelabel(self):
+        finished = False
+        while not self.prelabel_queue.empty():
+            kind, payload = self.prelabel_queue.get_nowait()
+            if kind == "error":
+                messagebox.showerror("Error", f"Pre-labeling failed: {payload}")
+                finished = True
+            elif kind == "done":
+                finished = True
+            else:
+                self.update_image_info()
+        if finished:
+            self.update_image_info()
+            self.btn_prelabel.configure(text="🤖  Pre-label", state="normal")
+        else:
+            self.after(500, self._poll_prelabel)
+
+    def start_integrity_scan(self, report=True):
+        """Checks the folder's images in the background, dropping corrupt ones
+        from the view as each chunk completes. Runs quietly whenever a folder
+        opens; with report, a summary is shown when the scan ends."""
+        session = self.session
+        if self.scan_thread is not None and self.scan_thread.is_alive():
+            if report:
+                # Report on the scan already running (or the one it restarts)
+                self.scan_report = True
+                self.btn_check.configure(text="🩺  Checking...", state="disabled")
+            return  # _poll_integrity_scan starts over if the folder changed meanwhile
+        if not session.all_image_files:
+            if report:
+                messagebox.showinfo("Check Images", "No images to check.")
+            return
+
+        files = list(session.all_image_files)
+        cache = session.integrity_cache()
+        self.scan_report = report
+        self.scan_found = {}
+        if report:
+            self.btn_check.configure(text="🩺  Checking...", state="disabled")
+        self.scan_thread = threading.Thread(target=self._run_integrity_scan, args=(files, cache, session.index),
+                                            daemon=True)
+        self.scan_thread.start()
+        self.after(200, self._poll_integrity_scan)
+
+    def _run_integrity_scan(self, files, cache, index):
+        # The session's index identifies the folder the results belong to
+        try:
+            for found in iter_scan(files, cache, cancel=self.cancel_event):
+                self.scan_queue.put(("batch", index, found))
+            self.scan_queue.put(("done", index, None))
+        except Exception as e:
+            self.scan_queue.put(("error", index, e))
+
+    def _poll_integrity_scan(self):
+        session = self.session
+        finished = None
+        while not self.scan_queue.empty():
+            kind, index, payload = self.scan_queue.get_nowait()
+            if kind == "batch":
+                if index is session.index:
+                    self.scan_found.update(payload)
+                    if session.drop_corrupt(payload):
+                        self.refresh_view()
+            else:
+                finished = (kind, index, payload)
+        if finished is None:
+            self.after(200, self._poll_integrity_scan)
+            return
+
+        kind, index, payload = finished
+        report = self.scan_report
+        self.scan_report = False
+        self.btn_check.configure(text="🩺  Check Images", state="normal")
+        if kind == "error":
+            if report:
+                messagebox.showerror("Error", f"Integrity scan failed: {payload}")
+            else:
+                print(f"Integrity scan failed: {payload}")
+            return
+        if index is not session.index:
+            self.start_integrity_scan(report)
+            return
+        if not report:
+            return
+
+        found = self.scan_found
+        corrupt = [p for p, (status, _) in found.items() if status == CORRUPT]
+        oversized = [f"{Path(p).name}: {msg}" for p, (status, msg) in found.items() if status == OVERSIZED]
+        msg = f"Corrupt or unreadable: {len(corrupt)}\nLarger than Pillow's decompression-bomb limit: {len(oversized)}"
+        if oversized:
+            msg += "\n\n" + "\n".join(oversized[:10])
+        if corrupt and session.source is not None and not session.source.read_only:
+            if messagebox.askyesno("Check Images", msg + "\n\nMove corrupt files to the quarantine folder?"):
+                session.drop_corrupt(found, move=True)
+        else:
+            messagebox.showinfo("Check Images", msg)
+
+    def change_sort(self, choice):
+        session = self.session
+        session.sort_by = choice.split(": ", 1)[1].lower()
+        session.save_config()
+        self.rearrange()
+        self.start_metadata_index()
+
+    def rearrange(self):
+        """Re-sorts the view, staying on the current image."""
+        session = self.session
+        current = session.current_file()
+        session.apply_filter()
+        if current is not None and current in session.image_files:
+            session.current_index = session.image_files.index(current)
+        self.refresh_view()
+
+    def start_metadata_index(self):
+        """Indexes capture time, camera and size in the background when sorting needs them."""
+        session = self.session
+        if session.sort_by == "name" or not session.all_image_files:
+            return
+        if self.metadata_thread is not None and self.metadata_thread.is_alive():
+            return  # _poll_metadata_index starts over if the folder changed meanwhile
+        files = session.all_image_files
+        cache = session.metadata_cache()
+        self.metadata_thread = threading.Thread(target=self._run_metadata_index, args=(files, cache), daemon=True)
+        self.metadata_thread.start()
+        self.after(200, self._poll_metadata_index)
+
+    def _run_metadata_index(self, files, cache):
+        try:
+            self.metadata_queue.put(("done", files, index_metadata(files, cache, cancel=self.cancel_event)))
+        except Exception as e:
+            self.metadata_queue.put(("error", files, e))
+
+    def _poll_metadata_index(self):
+        if self.metadata_queue.empty():
+            self.after(200, self._poll_metadata_index)
+            return
+        kind, files, payload = self.metadata_queue.get_nowait()
+        if kind == "error":
+            messagebox.showerror("Error", f"Reading image metadata failed: {payload}")
+            return
+        if files is not self.session.all_image_files:
+            self.start_metadata_index()
+        elif payload:
+            self.rearrange()
+
+    def move_to_trash(self):
+        try:
+            if self.session.move_to_trash():
+                self.display_current_image()
+                self.update_status()
+            elif self.session.source is not None and self.session.source.read_only:
+                messagebox.showinfo("Trash", "Images inside an archive cannot be moved to trash.")
         except Exception as e:
             messagebox.showerror("Error", f"Could not move to trash: {e}")
 
     def rotate_image(self, degrees):
-        self.current_rotation = (self.current_rotation + degrees) % 360
+        self.session.current_rotation = (self.session.current_rotation + degrees) % 360
         self.display_current_image()
 
     def display_current_image(self):
-        if not self.image_files:
-            if self.all_image_files:
+        session = self.session
+        if not session.image_files:
+            if session.query is not None and session.all_image_files:
+                txt = "No images match the filter"
+                self.lbl_subinfo.configure(text="Clear or change the filter to see more images.")
+            elif session.all_image_files:
                 txt = "All images labeled!"
                 self.lbl_subinfo.configure(text="Great job! Check the organization tab to move files.")
             else:
@@ -471,90 +1360,279 @@ class ImageLabelerApp(ctk.CTk):
             self.current_image_ref = None 
             return
 
-        if 0 <= self.current_index < len(self.image_files):
-            file_path = self.image_files[self.current_index]
-            current_label = self.labels.get(str(file_path), "Unlabeled")
-            
+        file_path = session.current_file()
+        if file_path is not None:
             self.lbl_filename.configure(text=file_path.name)
-            self.lbl_subinfo.configure(text=f"Current Status: {current_label}  •  {self.current_index + 1} of {len(self.image_files)}")
+            self.update_image_info()
 
             try:
-                area_width = self.image_area_frame.winfo_width()
-                area_height = self.image_area_frame.winfo_height()
-                
-                # Subtract padding rough estimate
-                area_width -= 60
-                area_height -= 40
-
-                if area_width < 100: area_width = 800
-                if area_height < 100: area_height = 600
-
-                pil_img = Image.open(file_path)
-                
-                # Apply rotation
-                if self.current_rotation != 0:
-                    pil_img = pil_img.rotate(self.current_rotation, expand=True)
-
-                ratio = min(area_width / pil_img.width, area_height / pil_img.height)
-                new_width = int(pil_img.width * ratio)
-                new_height = int(pil_img.height * ratio)
-                
-                my_image = ctk.CTkImage(light_image=pil_img, dark_image=pil_img, size=(new_width, new_height))
-                self.current_image_ref = my_image 
-                self.image_label.configure(image=my_image, text="")
+                self.show_image(file_path)
             except Exception as e:
+                self.viewer = None
+                self.viewer_file = None
                 self.image_label.configure(image=None, text=f"Error loading image: {e}")
         else:
             self.image_label.configure(text="End of list", image=None)
 
+    def view_size(self):
+        area_width = self.image_area_frame.winfo_width()
+        area_height = self.image_area_frame.winfo_height()
+        
+        # Subtract padding rough estimate
+        area_width -= 60
+        area_height -= 40
+
+        if area_width < 100: area_width = 800
+        if area_height < 100: area_height = 600
+        return area_width, area_height
+
+    def show_image(self, file_path):
+        """Shows file_path in the zoomable viewer, tiling it first if it is huge."""
+        if self.viewer_file != str(file_path):
+            self.viewer = None
+            self.viewer_file = None
+            if should_tile(file_path):
+                out_dir = pyramid_dir(file_path)
+                if not DiskPyramid.exists(out_dir):
+                    self.start_pyramid_build(file_path, out_dir)
+                    return
+                self.viewer = TileViewer(DiskPyramid(out_dir))
+            else:
+                with open_image(file_path) as pil_img:
+                    mode = "RGBA" if pil_img.has_transparency_data else "RGB"
+                    self.viewer = TileViewer(MemoryPyramid(pil_img.convert(mode)))
+            self.viewer_file = str(file_path)
+
+        self.viewer.rotation = self.session.current_rotation
+        self.render_view()
+
+    def render_view(self):
+        self._render_pending = False
+        if self.viewer is None:
+            return
+        pil_img = self.viewer.render(*self.view_size())
+        my_image = ctk.CTkImage(light_image=pil_img, dark_image=pil_img, size=pil_img.size)
+        self.current_image_ref = my_image 
+        self.image_label.configure(image=my_image, text="")
+
+    def schedule_render(self):
+        # Coalesce bursts of wheel/drag events into one render per idle cycle.
+        if not self._render_pending:
+            self._render_pending = True
+            self.after_idle(self.render_view)
+
+    def start_pyramid_build(self, file_path, out_dir):
+        self.image_label.configure(image=None, text="Large image: building zoom tiles...")
+        self.current_image_ref = None
+        if out_dir in self.pyramid_builds:
+            return
+        if self.tile_pool is None:
+            self.tile_pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        self.pyramid_builds[out_dir] = self.tile_pool.submit(build_pyramid, str(file_path), out_dir)
+        self.after(200, self._poll_pyramid_build, str(file_path), out_dir)
+
+    def _poll_pyramid_build(self, path_str, out_dir):
+        future = self.pyramid_builds[out_dir]
+        if not future.done():
+            self.after(200, self._poll_pyramid_build, path_str, out_dir)
+            return
+        del self.pyramid_builds[out_dir]
+        current = self.session.current_file()
+        if current is None or str(current) != path_str:
+            return
+        if future.exception() is not None:
+            self.image_label.configure(image=None, text=f"Error loading image: {future.exception()}")
+        else:
+            self.display_current_image()
+
+    def _view_point(self, event):
+        """Event position relative to the rendered viewport, in logical pixels."""
+        scaling = ctk.ScalingTracker.get_widget_scaling(self.image_label)
+        view_w, view_h = self.view_size()
+        x = (event.x_root - self.image_label.winfo_rootx()) / scaling
+        y = (event.y_root - self.image_label.winfo_rooty()) / scaling
+        x -= (self.image_label.winfo_width() / scaling - view_w) / 2
+        y -= (self.image_label.winfo_height() / scaling - view_h) / 2
+        return x, y
+
+    def on_zoom(self, event, factor):
+        if self.viewer is None:
+            return
+        x, y = self._view_point(event)
+        self.viewer.zoom_at(factor, x, y, *self.view_size())
+        self.schedule_render()
+
+    def on_drag_start(self, event):
+        self._drag_origin = (event.x_root, event.y_root)
+
+    def on_drag(self, event):
+        if self.viewer is None or self._drag_origin is None:
+            return
+        scaling = ctk.ScalingTracker.get_widget_scaling(self.image_label)
+        dx = (event.x_root - self._drag_origin[0]) / scaling
+        dy = (event.y_root - self._drag_origin[1]) / scaling
+        self._drag_origin = (event.x_root, event.y_root)
+        self.viewer.pan(dx, dy, *self.view_size())
+        self.schedule_render()
+
+    def reset_zoom(self):
+        if self.viewer is not None:
+            self.viewer.reset()
+            self.schedule_render()
+
+    def update_image_info(self):
+        session = self.session
+        file_path = session.current_file()
+        if file_path is None:
+            return
+        current_label = session.labels.get(str(file_path), "Unlabeled")
+        status = f"Current Status: {current_label}  •  {session.current_index + 1} of {len(session.image_files)}"
+        suggestion = session.current_suggestion()
+        if suggestion is not None and str(file_path) not in session.labels:
+            status += f"  •  Suggested: {suggestion[0]} ({suggestion[1]:.0%}, Enter to accept)"
+        if session.sort_by != "name":
+            start, end = session.current_group()
+            if end - start > 1:
+                status += f"  •  Group: {session.current_index - start + 1} of {end - start}"
+                if self.label_group_var.get():
+                    status += " (labels apply to all)"
+        self.lbl_subinfo.configure(text=status)
+
     def next_image(self):
-        self.current_rotation = 0 # Reset rotation
-        if self.current_index < len(self.image_files) - 1:
-            self.current_index += 1
+        session = self.session
+        session.current_rotation = 0 # Reset rotation
+        if session.current_index < len(session.image_files) - 1:
+            session.current_index += 1
             self.display_current_image()
         else:
             messagebox.showinfo("Done", "You have reached the last image.")
 
     def prev_image(self):
-        self.current_rotation = 0 # Reset rotation
-        if self.current_index > 0:
-            self.current_index -= 1
+        session = self.session
+        session.current_rotation = 0 # Reset rotation
+        if session.current_index > 0:
+            session.current_index -= 1
             self.display_current_image()
 
     def refresh_category_buttons(self):
-        for btn in self.cat_buttons:
-            btn.destroy()
-        self.cat_buttons = []
-        
-        if hasattr(self, 'custom_entry') and self.custom_entry:
-            self.custom_entry.destroy()
-        if hasattr(self, 'btn_custom') and self.btn_custom:
-            self.btn_custom.destroy()
-
-        for cat in self.categories:
-            btn = ctk.CTkButton(self.cat_frame, text=cat, command=lambda c=cat: self.save_label(c),
-                                height=40, font=ctk.CTkFont(size=14))
-            btn.pack(pady=5, padx=5, fill="x")
+        """Re-ranks the categories and relabels the visible buttons."""
+        self.cat_ranked = self.session.ranked_categories(self.cat_search_entry.get())
+        self.cat_first = max(0, min(self.cat_first, len(self.cat_ranked) - self.cat_visible))
+        self.update_category_buttons()
+
+    def update_category_buttons(self):
+        """Shows cat_ranked from cat_first on the pooled buttons. Only buttons
+        whose text changed are touched."""
+        for slot, btn in enumerate(self.cat_buttons):
+            pos = self.cat_first + slot
+            if slot < self.cat_visible and pos < len(self.cat_ranked):
+                cat = self.cat_ranked[pos]
+                text = f"{pos + 1}   {cat}" if pos < CATEGORY_HOTKEYS else cat
+                if self.cat_button_text[slot] is None:
+                    btn.grid(row=slot, column=0, sticky="ew", padx=5, pady=5)
+                if self.cat_button_text[slot] != text:
+                    btn.configure(text=text)
+                    self.cat_button_text[slot] = text
+            elif self.cat_button_text[slot] is not None:
+                btn.grid_remove()
+                self.cat_button_text[slot] = None
+
+        total = len(self.cat_ranked)
+        if total > self.cat_visible:
+            self.cat_scrollbar.set(self.cat_first / total, (self.cat_first + self.cat_visible) / total)
+        else:
+            self.cat_scrollbar.set(0, 1)
+
+    def on_category_resize(self, event):
+        row_height = CATEGORY_ROW_HEIGHT * ctk.ScalingTracker.get_widget_scaling(self)
+        visible = max(1, int(event.height // row_height))
+        while len(self.cat_buttons) < visible:
+            slot = len(self.cat_buttons)
+            btn = ctk.CTkButton(self.cat_list, text="", command=lambda s=slot: self.pick_category(self.cat_first + s),
+                                height=40, font=ctk.CTkFont(size=14), anchor="w")
+            self.bind_category_scroll(btn)
             self.cat_buttons.append(btn)
-        
-        # Custom Entry - Placed in the fixed bottom frame
-        self.custom_frame = ctk.CTkFrame(self.cat_outer_frame, fg_color="transparent")
-        self.custom_frame.grid(row=2, column=0, sticky="ew", padx=15, pady=20)
-        
-        self.custom_entry = ctk.CTkEntry(self.custom_frame, placeholder_text="New Category...", height=35)
-        self.custom_entry.pack(side="left", fill="x", expand=True, padx=(0, 5))
-        
-        self.btn_custom = ctk.CTkButton(self.custom_frame, text="Add", width=60, height=35, 
-                                        fg_color="transparent", border_width=1,
-                                        command=self.save_custom_category)
-        self.btn_custom.pack(side="right")
+            self.cat_button_text.append(None)
+        if visible != self.cat_visible:
+            self.cat_visible = visible
+            self.refresh_category_buttons()
+
+    def bind_category_scroll(self, widget):
+        widget.bind("<MouseWheel>", lambda e: self.scroll_categories(-1 if e.delta > 0 else 1))
+        widget.bind("<Button-4>", lambda e: self.scroll_categories(-1))
+        widget.bind("<Button-5>", lambda e: self.scroll_categories(1))
+
+    def scroll_categories(self, rows):
+        first = max(0, min(self.cat_first + rows, len(self.cat_ranked) - self.cat_visible))
+        if first != self.cat_first:
+            self.cat_first = first
+            self.update_category_buttons()
+
+    def on_category_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self.scroll_categories(round(float(args[1]) * len(self.cat_ranked)) - self.cat_first)
+        elif args[0] == "scroll":
+            step = self.cat_visible if args[2] == "pages" else 1
+            self.scroll_categories(int(args[1]) * step)
+
+    def on_category_search(self, event):
+        if event.keysym in ("Return", "Escape"):
+            return
+        self.cat_first = 0
+        self.refresh_category_buttons()
+
+    def on_category_search_return(self, event):
+        self.pick_category(0)
+        return "break"  # The window's Enter would accept a suggestion for the next image too
+
+    def on_category_search_escape(self, event):
+        self.clear_category_search()
+        return "break"
+
+    def clear_category_search(self):
+        if self.cat_search_entry.get():
+            self.cat_search_entry.delete(0, 'end')
+            self.cat_first = 0
+            self.refresh_category_buttons()
+        self.focus_set()
+
+    def change_category_order(self, choice):
+        self.session.category_order = choice.lower()
+        self.session.save_config()
+        self.cat_first = 0
+        self.refresh_category_buttons()
+
+    def pick_category(self, pos):
+        """Labels the current image with the category at pos in the ranked list."""
+        if pos >= len(self.cat_ranked):
+            return
+        category = self.cat_ranked[pos]
+        if self.cat_search_entry.get():
+            # A search is for one pick; start the next image from the full list
+            self.cat_search_entry.delete(0, 'end')
+            self.cat_first = 0
+            self.focus_set()
+        self.save_label(category)
+
+    def on_arrow_key(self, step):
+        if isinstance(self.focus_get(), tk.Entry):
+            return  # Moving the text cursor
+        if step < 0:
+            self.prev_image()
+        else:
+            self.next_image()
+
+    def on_category_hotkey(self, pos):
+        if isinstance(self.focus_get(), tk.Entry):
+            return  # Typing a digit
+        self.pick_category(pos)
 
     def save_custom_category(self):
         cat = self.custom_entry.get().strip()
         if cat:
-            if cat not in self.categories:
-                self.categories.append(cat)
-                self.save_config()
+            if cat not in self.session.categories:
+                self.session.categories.append(cat)
+                self.session.save_config()
                 self.refresh_category_buttons()
             self.save_label(cat)
             self.custom_entry.delete(0, 'end')
@@ -565,15 +1643,13 @@ class ImageLabelerApp(ctk.CTk):
         if new_cats_str:
             new_cats = [c.strip() for c in new_cats_str.split(',') if c.strip()]
             if new_cats:
-                self.categories = new_cats
-                self.save_config()
+                self.session.categories = new_cats
+                self.session.save_config()
                 self.refresh_category_buttons()
 
     def update_status(self):
-        total = len(self.all_image_files)
-        labeled_count = 0
-        if self.all_image_files:
-             labeled_count = len([f for f in self.all_image_files if str(f) in self.labels])
+        total = len(self.session.all_image_files)
+        labeled_count = self.session.labeled_count()
         
         if total > 0:
             progress = labeled_count / total
@@ -582,31 +1658,19 @@ class ImageLabelerApp(ctk.CTk):
             
         self.progress_bar.set(progress)
         self.lbl_progress.configure(text=f"Progress: {int(progress*100)}%")
-        self.lbl_counts.configure(text=f"{labeled_count} / {total}")
-
-    def load_config(self):
-        if os.path.exists(CONFIG_FILE):
-            try:
-                with open(CONFIG_FILE, 'r') as f:
-                    data = json.load(f)
-                    self.categories = data.get("categories", DEFAULT_CATEGORIES)
-                    self.image_folder = data.get("last_folder", "")
-                    self.csv_file = data.get("csv_file", "image_labels.csv")
-            except:
-                pass
-    
-    def save_config(self):
-        data = {
-            "categories": self.categories,
-            "last_folder": self.image_folder,
-            "csv_file": self.csv_file
-        }
-        with open(CONFIG_FILE, 'w') as f:
-            json.dump(data, f)
+        counts = f"{labeled_count} / {total}"
+        if self.session.project is not None:
+            project_labeled, project_total = self.session.project_progress()
+            counts += f"  •  project {project_labeled} / {project_total}"
+        self.lbl_counts.configure(text=counts)
 
     def change_appearance_mode_event(self, new_appearance_mode: str):
         ctk.set_appearance_mode(new_appearance_mode)
 
 if __name__ == "__main__":
-    app = ImageLabelerApp()
+    parser = argparse.ArgumentParser(description="Label images into categories.")
+    parser.add_argument("--shard", type=parse_shard, metavar="i/N",
+                        help="label only slice i of N of each folder, e.g. 2/4")
+    args = parser.parse_args()
+    app = ImageLabelerApp(shard=args.shard)
     app.mainloop()
@@ -0,0 +1,210 @@
+"""Metadata index: capture time, camera and dimensions for sorting and grouping.
+
+Only image headers and EXIF are read, never pixel data, in worker processes.
+Records are cached by path together with the file's mtime and size, so a
+reindex only touches files that changed.
+
+Sorted by a field, images fall into groups of neighbours: bursts (same camera,
+shots at most ``BURST_GAP`` seconds apart) for ``time``, and equal values for
+``camera`` and ``size``. ``name`` keeps the folder order and has no groups.
+"""
+
+import os
+import json
+import datetime
+import warnings
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+from image_sources import open_image, parse_ref
+from integrity import file_stamp
+from pools import iter_completed
+
+FIELDS = ("name", "time", "camera", "size")
+BURST_GAP = 2.0  # seconds between shots of one burst
+EXIF_IFD = 0x8769
+DATETIME_ORIGINAL = 36867
+DATETIME = 306
+MAKE = 271
+MODEL = 272
+NO_EXIF_FORMATS = {"PNG", "GIF", "BMP"}  # EXIF, if any, may sit after the pixel data
+
+
+def metadata_cache_path(csv_file):
+    """The metadata index lives next to the label file, like the other caches."""
+    return str(Path(csv_file).with_suffix(".metadata.json"))
+
+
+def _exif_time(value):
+    """EXIF 'YYYY:MM:DD HH:MM:SS' as an ISO timestamp, or None."""
+    try:
+        return datetime.datetime.strptime(str(value).strip("\x00 "), "%Y:%m:%d %H:%M:%S").isoformat()
+    except ValueError:
+        return None
+
+
+def read_metadata(path_str):
+    """Header fields of one image. Runs in worker processes.
+
+    Returns {"time", "camera", "width", "height"}; time falls back to the
+    file's mtime when there is no EXIF capture time. None if unreadable.
+    """
+    ref = parse_ref(path_str)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            with open_image(ref) as img:
+                width, height = img.size
+                exif = img.getexif() if img.format not in NO_EXIF_FORMATS else {}
+                captured = None
+                camera = ""
+                if exif:
+                    captured = _exif_time(exif.get_ifd(EXIF_IFD).get(DATETIME_ORIGINAL, "")) \
+                        or _exif_time(exif.get(DATETIME, ""))
+                    make = str(exif.get(MAKE, "")).strip("\x00 ")
+                    model = str(exif.get(MODEL, "")).strip("\x00 ")
+                    camera = model if model.startswith(make) else f"{make} {model}".strip()
+        if captured is None:
+            captured = datetime.datetime.fromtimestamp(file_stamp(ref)[0]).isoformat()
+    except Exception:
+        return None
+    return {"time": captured, "camera": camera, "width": width, "height": height}
+
+
+def _read_chunk(paths):
+    return [read_metadata(path_str) for path_str in paths]
+
+
+class MetadataCache:
+    """Metadata records keyed by path, valid while the file's stamp is unchanged."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}  # Map: image_path -> [mtime, size, record]
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                print(f"Error loading metadata index: {e}")
+
+    def is_current(self, ref, stamp):
+        """True if ref was indexed with this stamp (its record may still be None)."""
+        entry = self.entries.get(str(ref))
+        return entry is not None and entry[:2] == stamp
+
+    def record(self, ref):
+        """Last indexed record without checking the file; for ordering only."""
+        entry = self.entries.get(str(ref))
+        return entry[2] if entry is not None else None
+
+    def put(self, ref, stamp, record):
+        self.entries[str(ref)] = [stamp[0], stamp[1], record]
+
+    def save(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+
+
+def index_metadata(image_files, cache, workers=None, chunksize=64, cancel=None):
+    """Reads metadata for every image not cached with its current stamp.
+
+    Setting the cancel event drops the chunks not yet started. Returns the
+    number of images read.
+    """
+    todo = []
+    for ref in image_files:
+        try:
+            stamp = file_stamp(ref)
+        except OSError:
+            continue
+        if not cache.is_current(ref, stamp):
+            todo.append((ref, stamp))
+
+    if todo:
+        context = multiprocessing.get_context("spawn")
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                chunks = {}
+                for i in range(0, len(todo), chunksize):
+                    chunk = todo[i:i + chunksize]
+                    chunks[pool.submit(_read_chunk, [str(ref) for ref, _ in chunk])] = chunk
+                read = 0
+                for future in iter_completed(pool, chunks, cancel):
+                    for (ref, stamp), record in zip(chunks[future], future.result()):
+                        cache.put(ref, stamp, record)
+                        read += 1
+        finally:
+            cache.save()
+        return read
+    return 0
+
+
+def _timestamp(record):
+    return datetime.datetime.fromisoformat(record["time"]).timestamp()
+
+
+def _sort_key(field, record):
+    if field == "time":
+        return (record["time"], record["camera"])
+    if field == "camera":
+        return (record["camera"], record["time"])
+    return (record["width"], record["height"], record["time"])
+
+
+def same_group(field, a, b, burst_gap=BURST_GAP):
+    """True if records a and b, adjacent in field order, belong to one group."""
+    if field == "name" or a is None or b is None:
+        return False
+    if field == "time":
+        return a["camera"] == b["camera"] and abs(_timestamp(b) - _timestamp(a)) <= burst_gap
+    if field == "camera":
+        return a["camera"] == b["camera"]
+    return (a["width"], a["height"]) == (b["width"], b["height"])
+
+
+def arrange(files, record_of, field):
+    """files sorted by field. Images without a record keep their order at the end.
+
+    record_of maps a file to its record or None. The sort is stable, so ties
+    stay in folder order.
+    """
+    if field == "name":
+        return list(files)
+    if field not in FIELDS:
+        raise ValueError(f"Unknown sort field '{field}'")
+    known = []
+    unknown = []
+    for f in files:
+        record = record_of(f)
+        if record is None:
+            unknown.append(f)
+        else:
+            known.append((_sort_key(field, record), f))
+    known.sort(key=lambda item: item[0])
+    return [f for _, f in known] + unknown
+
+
+def group_starts(files, record_of, field, burst_gap=BURST_GAP):
+    """Index of the first image of every group in an arranged list."""
+    starts = []
+    previous = None
+    for i, f in enumerate(files):
+        record = record_of(f)
+        if i == 0 or not same_group(field, previous, record, burst_gap):
+            starts.append(i)
+        previous = record
+    return starts
+
+
+def group_bounds(files, i, record_of, field, burst_gap=BURST_GAP):
+    """(start, end) of the group around files[i]; end is exclusive."""
+    start = end = i
+    while start > 0 and same_group(field, record_of(files[start - 1]), record_of(files[start]), burst_gap):
+        start -= 1
+    while end + 1 < len(files) and same_group(field, record_of(files[end]), record_of(files[end + 1]), burst_gap):
+        end += 1
+    return start, end + 1
@@ -0,0 +1,28 @@
+"""Helpers for the background process pools.
+
+The GUI runs pools from daemon threads. ``concurrent.futures`` still joins a
+pool's manager thread at interpreter exit and finishes every queued work
+item, so closing the window mid-run would leave the process busy until the
+whole run is done. Runs therefore take a ``threading.Event``; once it is set,
+queued work is cancelled and only the items already running finish.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, wait
+
+POLL_SECONDS = 0.2
+
+
+def iter_completed(pool, futures, cancel=None):
+    """Yields futures as they finish, like ``as_completed``.
+
+    If cancel gets set, the pool's queued work is cancelled and iteration
+    stops without waiting for it.
+    """
+    pending = set(futures)
+    while pending:
+        timeout = POLL_SECONDS if cancel is not None else None
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        yield from done
+        if cancel is not None and cancel.is_set():
+            pool.shutdown(wait=False, cancel_futures=True)
+            return
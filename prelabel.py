@@ -0,0 +1,143 @@
+"""Model-assisted pre-labeling.
+
+A classifier plugin is any callable ``classify(images, categories)`` that takes
+a batch of decoded RGB ``PIL.Image`` objects and returns one ``{category:
+score}`` dict per image. Plugins are referenced as ``"module:function"`` so
+each worker process can import its own copy; they run CPU-only and must not
+need network access.
+"""
+
+import os
+import json
+import importlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from image_sources import open_image, parse_ref
+from pools import iter_completed
+
+DEFAULT_MODEL = "prelabel:baseline_classifier"
+DEFAULT_THRESHOLD = 0.9
+BATCH_SIZE = 16
+INPUT_SIZE = (224, 224)
+
+
+def baseline_classifier(images, categories):
+    """Scores every category equally. Stands in for a real model when testing."""
+    if not categories:
+        return [{} for _ in images]
+    score = 1.0 / len(categories)
+    return [{cat: score for cat in categories} for _ in images]
+
+
+def load_plugin(spec):
+    """Imports a ``"module:function"`` classifier."""
+    module_name, _, attr = spec.partition(":")
+    if not module_name or not attr:
+        raise ValueError(f"Classifier must look like 'module:function', got '{spec}'")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def suggestion_cache_path(csv_file):
+    """Suggestions live next to the label file they belong to."""
+    return str(Path(csv_file).with_suffix(".suggestions.json"))
+
+
+class SuggestionCache:
+    """Best category and confidence per image path, persisted as JSON.
+
+    The cache remembers which model produced it and starts empty when the
+    model changes.
+    """
+
+    def __init__(self, path, model=DEFAULT_MODEL):
+        self.path = path
+        self.model = model
+        self.entries = {}  # Map: image_path -> (category, confidence)
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get("model") == model:
+                    self.entries = {k: tuple(v) for k, v in data.get("suggestions", {}).items()}
+            except Exception as e:
+                print(f"Error loading suggestions: {e}")
+
+    def get(self, image_path):
+        return self.entries.get(str(image_path))
+
+    def update(self, results):
+        for image_path, category, confidence in results:
+            self.entries[image_path] = (category, confidence)
+
+    def save(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({"model": self.model, "suggestions": self.entries}, f)
+
+
+# Per-process classifier, set up by the pool initializer.
+_classifier = None
+
+
+def _init_worker(model):
+    # Keep accelerator runtimes from claiming a GPU in every worker.
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+    global _classifier
+    _classifier = load_plugin(model)
+
+
+def _decode(path_str):
+    with open_image(parse_ref(path_str)) as img:
+        img.draft("RGB", INPUT_SIZE)  # Lets JPEG decode at reduced scale
+        img = img.convert("RGB")
+    img.thumbnail(INPUT_SIZE)
+    return img
+
+
+def _score_batch(paths, categories):
+    """Worker entry point: decodes a batch and returns (path, category, confidence)."""
+    images = []
+    decoded = []
+    for path_str in paths:
+        try:
+            images.append(_decode(path_str))
+            decoded.append(path_str)
+        except Exception:
+            continue  # Unreadable files simply get no suggestion
+    if not images:
+        return []
+
+    results = []
+    for path_str, scores in zip(decoded, _classifier(images, categories)):
+        if scores:
+            best = max(scores, key=scores.get)
+            results.append((path_str, best, float(scores[best])))
+    return results
+
+
+def run_prelabel(image_files, categories, cache, model=DEFAULT_MODEL, batch_size=BATCH_SIZE, workers=None,
+                 cancel=None):
+    """Scores every image without a cached suggestion in a process pool.
+
+    Yields the results of each batch as it completes so callers can report
+    progress. Setting the cancel event drops the batches not yet started. The
+    cache is saved when the run ends, even if interrupted.
+    """
+    todo = [str(f) for f in image_files if cache.get(f) is None]
+    batches = [todo[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+    if not batches:
+        return
+
+    # Spawned workers never inherit the caller's GUI or threads.
+    context = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(model,)) as pool:
+            futures = [pool.submit(_score_batch, batch, list(categories)) for batch in batches]
+            for future in iter_completed(pool, futures, cancel):
+                results = future.result()
+                cache.update(results)
+                yield results
+    finally:
+        cache.save()
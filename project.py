@@ -0,0 +1,144 @@
+"""Multi-folder labeling projects.
+
+A project is a JSON file listing image roots (folders or archives). Each root
+has its own label shard (a CSV in ``labels/`` next to the project file) and a
+cached summary of its progress, so a project opens on summaries alone and a
+root's shard and file list are only read when it is visited.
+"""
+
+import os
+import csv
+import json
+import hashlib
+from collections import Counter
+from pathlib import Path
+
+from integrity import file_stamp
+
+SHARD_DIR = "labels"
+
+
+def shard_path(project_path, root_path):
+    """Default label shard for a root: readable name plus a hash of its path."""
+    name = Path(root_path).name or "root"
+    digest = hashlib.sha1(os.path.abspath(root_path).encode("utf-8")).hexdigest()[:8]
+    return str(Path(project_path).parent / SHARD_DIR / f"{name}-{digest}.csv")
+
+
+def shard_stamp(csv_file):
+    try:
+        return file_stamp(csv_file)
+    except OSError:
+        return None
+
+
+def count_shard(csv_file):
+    """Category counts in a label shard; the last row for a path wins."""
+    labels = {}
+    if os.path.exists(csv_file):
+        with open(csv_file, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None) # Skip header
+            for row in reader:
+                if row:
+                    labels[row[0]] = row[1]
+    return Counter(labels.values())
+
+
+class Project:
+    """Roots, their label shards and cached summaries, stored as JSON.
+
+    Each root is a dict ``{"path", "csv_file", "summary"}`` where summary is
+    ``{"total", "labeled", "counts", "stamp"}`` or None if never visited.
+    ``stamp`` is the shard's (mtime, size) when the summary was taken.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.roots = []
+        self.last_root = ""
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.roots = data.get("roots", [])
+            self.last_root = data.get("last_root", "")
+
+    def save(self):
+        data = {"roots": self.roots, "last_root": self.last_root}
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+
+    def find_root(self, folder):
+        for root in self.roots:
+            if root["path"] == folder:
+                return root
+        return None
+
+    def add_root(self, folder):
+        root = self.find_root(folder)
+        if root is None:
+            csv_file = shard_path(self.path, folder)
+            os.makedirs(os.path.dirname(csv_file), exist_ok=True)
+            root = {"path": folder, "csv_file": csv_file, "summary": None}
+            self.roots.append(root)
+        return root
+
+    def remove_root(self, folder):
+        """Forgets a root. Its label shard is left on disk."""
+        self.roots = [root for root in self.roots if root["path"] != folder]
+        if self.last_root == folder:
+            self.last_root = ""
+
+    def update_summary(self, folder, total, labeled, counts):
+        root = self.find_root(folder)
+        root["summary"] = {
+            "total": total,
+            "labeled": labeled,
+            "counts": dict(counts),
+            "stamp": shard_stamp(root["csv_file"]),
+        }
+
+    def refresh_stale(self):
+        """Recounts summaries whose shard changed outside the app.
+
+        Only the shard is read; the image total is kept from the last visit.
+        Returns the number of summaries refreshed.
+        """
+        refreshed = 0
+        for root in self.roots:
+            summary = root["summary"]
+            stamp = shard_stamp(root["csv_file"])
+            if summary is None or summary.get("stamp") == stamp:
+                continue
+            counts = count_shard(root["csv_file"])
+            summary["counts"] = dict(counts)
+            summary["labeled"] = sum(counts.values())
+            summary["stamp"] = stamp
+            refreshed += 1
+        return refreshed
+
+    def progress(self, live=None):
+        """Returns (labeled, total) across all roots from their summaries.
+
+        live maps a root path to an up-to-date (labeled, total) that replaces
+        its summary, e.g. for the root currently being labeled.
+        """
+        live = live or {}
+        labeled = total = 0
+        for root in self.roots:
+            if root["path"] in live:
+                root_labeled, root_total = live[root["path"]]
+            elif root["summary"] is not None:
+                root_labeled, root_total = root["summary"]["labeled"], root["summary"]["total"]
+            else:
+                continue
+            labeled += root_labeled
+            total += root_total
+        return labeled, total
+
+    def category_counts(self):
+        counts = Counter()
+        for root in self.roots:
+            if root["summary"] is not None:
+                counts.update(root["summary"]["counts"])
+        return counts
@@ -0,0 +1,288 @@
+"""Indexed filters for the labeling view.
+
+``LabelIndex`` keeps secondary indexes over a folder's sorted file list, with
+images identified by their position in that list:
+
+* category -> bitmap of positions (a Python int, bit i = position i),
+* labeled positions ordered by label timestamp,
+* relative paths in sorted order, so a path prefix is one contiguous range.
+* per-category label counts and latest label time, for ordering the
+  category panel.
+
+A ``Query`` resolves by intersecting bitmaps, which stays fast on folders with
+millions of images. Queries are written as space-separated terms::
+
+    cat:dog  unlabeled  labeled  since:1h  until:2024-05-01  name:cam3_*  path:night/
+"""
+
+import os
+import re
+import bisect
+import datetime
+import fnmatch
+from collections import Counter
+from itertools import compress
+
+_BITS = bytes.maketrans(b"01", b"\x00\x01")
+_DIGITS = bytes.maketrans(b"\x00\x01", b"01")
+_DURATION = re.compile(r"^(\d+(?:\.\d+)?)([smhdw])$")
+_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+
+
+def bitmap(positions):
+    """Builds a position bitmap from an iterable of ints."""
+    positions = positions if isinstance(positions, list) else list(positions)
+    if not positions:
+        return 0
+    flags = bytearray(max(positions) + 1)
+    for pos in positions:
+        flags[pos] = 1
+    return int(flags[::-1].translate(_DIGITS), 2)
+
+
+def positions(bits):
+    """Sorted positions set in a bitmap."""
+    if not bits:
+        return []
+    flags = bin(bits)[:1:-1].encode("ascii").translate(_BITS)
+    return list(compress(range(len(flags)), flags))
+
+
+def parse_time(value, now=None):
+    """Accepts a duration back from now (``90s``, ``30m``, ``1h``, ``2d``, ``1w``)
+    or an ISO date/time. Returns an ISO timestamp string."""
+    now = now or datetime.datetime.now()
+    match = _DURATION.match(value)
+    if match:
+        delta = datetime.timedelta(**{_UNITS[match.group(2)]: float(match.group(1))})
+        return (now - delta).isoformat()
+    try:
+        return datetime.datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ValueError(f"Not a duration or date: '{value}'")
+
+
+class Query:
+    """A conjunction of filter terms; unset fields don't filter."""
+
+    def __init__(self, categories=None, labeled=None, since=None, until=None, name=None, prefix=None):
+        self.categories = categories or []  # any of these categories
+        self.labeled = labeled  # True, False or None
+        self.since = since  # ISO timestamps
+        self.until = until
+        self.name = name  # glob on the file name
+        self.prefix = prefix  # relative path prefix, e.g. a subfolder
+
+    def is_empty(self):
+        return not (self.categories or self.labeled is not None or self.since or self.until
+                    or self.name or self.prefix)
+
+    def constrains_labels(self):
+        """True if the query already says which labels it wants to see."""
+        return bool(self.categories or self.labeled is not None or self.since or self.until)
+
+
+def parse_query(text, now=None):
+    """Parses the filter box syntax into a Query. Raises ValueError on bad terms."""
+    query = Query()
+    for term in text.split():
+        key, sep, value = term.partition(":")
+        key = key.lower()
+        if not sep:
+            if key == "unlabeled":
+                query.labeled = False
+            elif key == "labeled":
+                query.labeled = True
+            else:
+                raise ValueError(f"Unknown filter '{term}'")
+        elif not value:
+            raise ValueError(f"Missing value in '{term}'")
+        elif key in ("cat", "category", "label"):
+            query.categories.append(value)
+        elif key == "since":
+            query.since = parse_time(value, now)
+        elif key == "until":
+            query.until = parse_time(value, now)
+        elif key == "name":
+            query.name = value
+        elif key in ("path", "dir"):
+            query.prefix = value
+        else:
+            raise ValueError(f"Unknown filter '{term}'")
+    return query
+
+
+class LabelIndex:
+    """Secondary indexes over one folder's file list and its labels."""
+
+    def __init__(self, files, labels, label_times, root=""):
+        self.files = list(files)  # Positions stay valid when the caller's list changes
+        paths = [str(f) for f in files]
+        self.position = dict(zip(paths, range(len(paths))))
+        self.all_bits = (1 << len(files)) - 1
+
+        # Path prefix index: relative keys in sorted order plus their positions
+        keys = relative_keys(files, paths, root)
+        self.key_order = sorted(range(len(files)), key=keys.__getitem__)
+        self.sorted_keys = [keys[i] for i in self.key_order]
+        self.flat = all("/" not in key for key in keys)
+
+        self.category_bits = {}
+        self.label_of = {}  # position -> category
+        self.time_of = {}  # position -> ISO timestamp
+        self.by_time = []  # sorted (timestamp, position)
+        self.counts = Counter()  # category -> labeled images
+        self.last_used = {}  # category -> latest label timestamp
+        grouped = {}
+        for path, category in labels.items():
+            pos = self.position.get(path)
+            if pos is None:
+                continue
+            self.label_of[pos] = category
+            grouped.setdefault(category, []).append(pos)
+            timestamp = label_times.get(path, "")
+            self.time_of[pos] = timestamp
+            self.by_time.append((timestamp, pos))
+        self.by_time.sort()
+        for category, members in grouped.items():
+            self.category_bits[category] = bitmap(members)
+            self.counts[category] = len(members)
+        for timestamp, pos in self.by_time:
+            self.last_used[self.label_of[pos]] = timestamp
+        self.labeled_bits = 0
+        for bits in self.category_bits.values():
+            self.labeled_bits |= bits
+
+    def set_label(self, path, category, timestamp):
+        pos = self.position.get(path)
+        if pos is None:
+            return
+        self.clear_label(path)
+        self.label_of[pos] = category
+        self.category_bits[category] = self.category_bits.get(category, 0) | (1 << pos)
+        self.labeled_bits |= 1 << pos
+        self.time_of[pos] = timestamp
+        bisect.insort(self.by_time, (timestamp, pos))
+        self.counts[category] += 1
+        self.last_used[category] = max(timestamp, self.last_used.get(category, ""))
+
+    def clear_label(self, path):
+        pos = self.position.get(path)
+        if pos is None or pos not in self.label_of:
+            return
+        category = self.label_of.pop(pos)
+        self.category_bits[category] &= ~(1 << pos)
+        self.labeled_bits &= ~(1 << pos)
+        self.counts[category] -= 1
+        entry = (self.time_of.pop(pos), pos)
+        i = bisect.bisect_left(self.by_time, entry)
+        if i < len(self.by_time) and self.by_time[i] == entry:
+            del self.by_time[i]
+        if self.last_used.get(category) == entry[0]:
+            # The latest remaining label of the category, if any
+            for timestamp, other in reversed(self.by_time):
+                if self.label_of.get(other) == category:
+                    self.last_used[category] = timestamp
+                    break
+            else:
+                del self.last_used[category]
+
+    def remove(self, path):
+        """Drops a file from every index in place. Its position stays reserved,
+        so the other positions are unchanged."""
+        pos = self.position.get(path)
+        if pos is None:
+            return
+        self.clear_label(path)
+        del self.position[path]
+        self.all_bits &= ~(1 << pos)
+
+    def labeled_count(self):
+        return self.labeled_bits.bit_count()
+
+    def category_counts(self):
+        return {cat: count for cat, count in self.counts.items() if count}
+
+    def _prefix_range(self, prefix):
+        lo = bisect.bisect_left(self.sorted_keys, prefix)
+        hi = bisect.bisect_left(self.sorted_keys, prefix + "\U0010ffff")
+        return lo, hi
+
+    def _prefix_bits(self, prefix):
+        lo, hi = self._prefix_range(prefix)
+        return bitmap(self.key_order[lo:hi])
+
+    def _name_bits(self, pattern):
+        candidates = self.key_order
+        literal = re.split(r"[*?\[]", pattern, maxsplit=1)[0]
+        if literal and self.flat:
+            # Keys are the file names, so the glob's literal head is a key range
+            lo, hi = self._prefix_range(literal)
+            if pattern == literal + "*":
+                return bitmap(self.key_order[lo:hi])
+            candidates = self.key_order[lo:hi]
+        match = re.compile(fnmatch.translate(pattern)).match
+        files = self.files
+        return bitmap([pos for pos in candidates if match(files[pos].name)])
+
+    def _time_bits(self, since, until):
+        lo = bisect.bisect_left(self.by_time, (since, -1)) if since else 0
+        hi = bisect.bisect_right(self.by_time, (until, len(self.files))) if until else len(self.by_time)
+        return bitmap([pos for _, pos in self.by_time[lo:hi]])
+
+    def resolve(self, query, hide_labeled=False):
+        """Positions matching query (and, if hide_labeled, not labeled), in file order."""
+        bits = self.all_bits
+        if query is not None and query.categories:
+            wanted = 0
+            for category in query.categories:
+                wanted |= self.category_bits.get(category, 0)
+            bits &= wanted
+        labeled = query.labeled if query is not None else None
+        if labeled is None and hide_labeled and not (query is not None and query.constrains_labels()):
+            labeled = False
+        if labeled is True:
+            bits &= self.labeled_bits
+        elif labeled is False:
+            bits &= ~self.labeled_bits
+        if query is not None:
+            if query.since or query.until:
+                bits &= self._time_bits(query.since, query.until)
+            if query.prefix:
+                bits &= self._prefix_bits(query.prefix)
+            if query.name:
+                bits &= self._name_bits(query.name)
+        return positions(bits)
+
+
+def relative_key(path, root):
+    """path relative to root with forward slashes, whichever way either is
+    spelled ('./images', 'images/', absolute). Raises ValueError if path is
+    not inside root."""
+    try:
+        key = os.path.relpath(os.path.abspath(path), os.path.abspath(root))
+    except ValueError:  # Another drive on Windows
+        key = os.pardir
+    if key == os.pardir or key.startswith(os.pardir + os.sep):
+        raise ValueError(f"'{path}' is not inside '{root}'")
+    return key.replace(os.sep, "/")
+
+
+def relative_keys(files, paths, root):
+    """Paths relative to their folder or archive, with forward slashes.
+
+    Raises ValueError if a path is not inside root, rather than hashing or
+    matching paths that would differ from one machine to the next.
+    """
+    if files and hasattr(files[0], "member"):
+        return [f.member for f in files]
+    if not root:
+        return [p.replace(os.sep, "/") for p in paths]
+    # Listed paths normally start with the normalized root; only the rest
+    # pay for a full resolve.
+    prefix = os.path.join(os.path.normpath(root), "")
+    cut = len(prefix)
+    keys = [p[cut:] if p.startswith(prefix) else relative_key(p, root) for p in paths]
+    if os.sep != "/":
+        keys = [key.replace(os.sep, "/") for key in keys]
+    return keys
@@ -0,0 +1,187 @@
+"""Splitting a folder across labelers and merging their label files.
+
+``--shard i/N`` gives each labeler a fixed slice of a folder: an image
+belongs to shard ``crc32(relative path) % N + 1``, so every machine agrees
+on the split without talking to the others, as long as they label the same
+folder, wherever it is mounted.
+
+``merge_labels`` combines the resulting label files. Label files store the
+paths each labeler saw, so when the folder was mounted in different places
+give every input its root: rows are then merged by path relative to it, the
+same key the shards use. Each input is sorted
+into runs on disk and the runs are merged in one streaming pass by path and
+timestamp, so memory stays bounded by ``RUN_ROWS`` whatever the input size.
+Images labeled in more than one file are conflicts; conflicts whose labels
+differ are disagreements and are written to a report next to the output.
+"""
+
+import os
+import csv
+import heapq
+import zlib
+import tempfile
+from collections import Counter
+from itertools import groupby
+
+from image_sources import ARCHIVE_SEPARATOR
+from query import relative_key, relative_keys
+
+RUN_ROWS = 500_000  # rows sorted in memory at a time while merging
+POLICIES = ("latest", "majority")
+REPORT_HEADER = ["image_path", "label_file", "category", "timestamp"]
+
+
+def parse_shard(text):
+    """Parses ``i/N`` (1 <= i <= N) into (i, N). Raises ValueError otherwise."""
+    index, sep, count = text.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise ValueError(f"Shard must look like 'i/N', got '{text}'")
+    if not sep or not 1 <= index <= count:
+        raise ValueError(f"Shard must look like 'i/N' with 1 <= i <= N, got '{text}'")
+    return index, count
+
+
+def shard_of(key, count):
+    """1-based shard of a relative path. crc32 is the same on every platform."""
+    return zlib.crc32(key.encode("utf-8")) % count + 1
+
+
+def select_shard(files, root, shard):
+    """The entries of files that belong to shard (i, N), in their original order."""
+    index, count = shard
+    keys = relative_keys(files, [str(f) for f in files], root)
+    return [f for f, key in zip(files, keys) if shard_of(key, count) == index]
+
+
+def report_path(output):
+    """Disagreements are reported next to the merged file."""
+    root, ext = os.path.splitext(output)
+    return f"{root}.conflicts{ext or '.csv'}"
+
+
+def merge_key(path, root):
+    """The path merge_labels groups a row by: relative to root if given.
+    Members of an archive root become their path inside the archive."""
+    if not root:
+        return path
+    archive, sep, member = path.partition(ARCHIVE_SEPARATOR)
+    if sep and member and relative_key(archive, root) == ".":
+        return member
+    return relative_key(path, root)
+
+
+def _write_run(rows, tmp_dir):
+    rows.sort()
+    fd, path = tempfile.mkstemp(suffix=".csv", dir=tmp_dir)
+    with os.fdopen(fd, 'w', newline='', encoding='utf-8') as f:
+        csv.writer(f).writerows(rows)
+    return path
+
+
+def _read_run(path):
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        for image_path, timestamp, file_no, row_no, category in csv.reader(f):
+            yield image_path, timestamp, int(file_no), int(row_no), category
+
+
+def _sort_into_runs(label_files, roots, tmp_dir, run_rows):
+    """Writes every label row as (key, timestamp, file, row, category) into sorted runs.
+
+    Returns the run files, the number of rows kept and the number of rows
+    skipped for lacking a path or category, or lying outside their root.
+    """
+    runs = []
+    rows = []
+    total = bad = 0
+    for file_no, (label_file, root) in enumerate(zip(label_files, roots)):
+        with open(label_file, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None) # Skip header
+            for row_no, row in enumerate(reader):
+                if not row:
+                    continue
+                if len(row) < 2 or not row[0]:
+                    bad += 1
+                    continue
+                try:
+                    key = merge_key(row[0], root)
+                except ValueError:
+                    bad += 1
+                    continue
+                rows.append((key, row[2] if len(row) > 2 else "", file_no, row_no, row[1]))
+                total += 1
+                if len(rows) >= run_rows:
+                    runs.append(_write_run(rows, tmp_dir))
+                    rows = []
+    if rows:
+        runs.append(_write_run(rows, tmp_dir))
+    return runs, total, bad
+
+
+def _resolve(per_file, policy):
+    """Picks the winning (timestamp, file, row, category) among one label per file."""
+    labels = per_file.values()
+    if policy == "majority":
+        votes = Counter(label[3] for label in labels)
+        best = max(votes.values())
+        return max(label for label in labels if votes[label[3]] == best)
+    return max(labels)
+
+
+def merge_labels(label_files, output, policy="latest", run_rows=RUN_ROWS, roots=None):
+    """Merges label files into one, with one row per image, sorted by path.
+
+    roots, if given, holds the folder or archive each label file's paths are
+    under (one per file); the output then has paths relative to it and rows
+    outside their root count as malformed. Within a file the latest label
+    for an image counts. Across files, policy
+    "latest" keeps the most recent label and "majority" the most common one
+    (the most recent among ties). Disagreements are written to
+    ``report_path(output)``, which is only created if there are any. Returns
+    counts of rows read, malformed rows skipped, images written, conflicts
+    and disagreements.
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown merge policy '{policy}'")
+    roots = list(roots) if roots is not None else [None] * len(label_files)
+    if len(roots) != len(label_files):
+        raise ValueError("Give one root per label file")
+    stats = {"rows": 0, "bad_rows": 0, "images": 0, "conflicts": 0, "disagreements": 0}
+    out_dir = os.path.dirname(os.path.abspath(output))
+    with tempfile.TemporaryDirectory(dir=out_dir) as tmp_dir:
+        runs, stats["rows"], stats["bad_rows"] = _sort_into_runs(label_files, roots, tmp_dir, run_rows)
+        merged = heapq.merge(*[_read_run(path) for path in runs])
+
+        tmp_output = os.path.join(tmp_dir, "merged.csv")
+        report = None
+        try:
+            with open(tmp_output, 'w', newline='', encoding='utf-8') as out:
+                writer = csv.writer(out)
+                writer.writerow(["image_path", "category", "timestamp"])
+
+                for image_path, rows in groupby(merged, key=lambda row: row[0]):
+                    # Rows arrive by timestamp, so the last one per file is its latest
+                    per_file = {}
+                    for _, timestamp, file_no, row_no, category in rows:
+                        per_file[file_no] = (timestamp, file_no, row_no, category)
+                    timestamp, _, _, category = _resolve(per_file, policy)
+                    writer.writerow([image_path, category, timestamp])
+                    stats["images"] += 1
+
+                    if len(per_file) > 1:
+                        stats["conflicts"] += 1
+                        if len({label[3] for label in per_file.values()}) > 1:
+                            stats["disagreements"] += 1
+                            if report is None:
+                                report = open(report_path(output), 'w', newline='', encoding='utf-8')
+                                report_writer = csv.writer(report)
+                                report_writer.writerow(REPORT_HEADER)
+                            for label_time, file_no, _, label in sorted(per_file.values(), key=lambda l: l[1]):
+                                report_writer.writerow([image_path, label_files[file_no], label, label_time])
+        finally:
+            if report is not None:
+                report.close()
+        os.replace(tmp_output, output)
+    return stats
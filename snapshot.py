@@ -0,0 +1,79 @@
+"""Snapshots of a resolved labeling session.
+
+Reopening a large folder normally means listing it, parsing the whole label
+CSV and rebuilding the query indexes. A snapshot stores the file list and
+labels together with the view position, so a resume only rebuilds the indexes.
+It is only used while the label file and the folder (or archive) still have
+the size and mtime recorded in it.
+
+Snapshots are plain JSON kept in a per-user cache directory, never next to
+the label file: a label file may sit on a shared drive, and whatever is
+loaded from there must not be able to run code.
+"""
+
+import os
+import sys
+import json
+import hashlib
+
+SNAPSHOT_VERSION = 3
+
+
+def user_cache_dir():
+    """Per-user cache directory of the labeler."""
+    base = os.environ.get("XDG_CACHE_HOME")
+    if not base and sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA")
+    if not base:
+        base = os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "gemini-image-labeler")
+
+
+def snapshot_dir():
+    return os.path.join(user_cache_dir(), "snapshots")
+
+
+def snapshot_path(csv_file):
+    """One snapshot per label file, named by a hash of its absolute path."""
+    key = hashlib.sha1(os.path.abspath(csv_file).encode("utf-8")).hexdigest()
+    return os.path.join(snapshot_dir(), f"{key}.json")
+
+
+def stamp(path):
+    """[mtime, size] of a file or folder, or None if it doesn't exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def write_snapshot(csv_file, folder, state):
+    """Writes state, which must be JSON-serializable, along with the stamps that keep it valid."""
+    data = dict(state)
+    data.update(version=SNAPSHOT_VERSION, folder=folder, csv_file=os.path.abspath(csv_file),
+                csv_stamp=stamp(csv_file), folder_stamp=stamp(folder))
+    path = snapshot_path(csv_file)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(csv_file, folder):
+    """Returns the snapshot state for csv_file and folder, or None if missing or stale."""
+    path = snapshot_path(csv_file)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"Error loading session snapshot: {e}")
+        return None
+    if (not isinstance(data, dict) or data.get("version") != SNAPSHOT_VERSION
+            or data.get("folder") != folder or data.get("csv_file") != os.path.abspath(csv_file)
+            or data.get("csv_stamp") != stamp(csv_file) or data.get("folder_stamp") != stamp(folder)):
+        return None
+    return data
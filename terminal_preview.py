@@ -0,0 +1,263 @@
+"""Inline image previews for the command-line labeler.
+
+Images are drawn straight into the terminal with the kitty graphics
+protocol, sixel, or (everywhere else) 24-bit ANSI half blocks, so labeling
+works over SSH and never launches an external viewer. ``PreviewPrefetcher``
+renders the next few images on a background thread while the user is
+choosing a category, and ``read_key`` takes single-keypress answers.
+"""
+
+import io
+import os
+import sys
+import base64
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+from image_sources import open_image
+
+PROTOCOLS = ("kitty", "sixel", "blocks")
+RESERVED_ROWS = 12  # terminal lines kept free for the menu and prompt
+SIXEL_COLORS = 64
+DEFAULT_CELL_SIZE = (8, 16)  # pixels per character cell when the terminal won't say
+
+
+def terminal_size():
+    """(columns, rows) available for a preview."""
+    size = shutil.get_terminal_size()
+    return max(10, size.columns - 1), max(5, size.lines - RESERVED_ROWS)
+
+
+def cell_size():
+    """Pixel size of one character cell, from TIOCGWINSZ where supported."""
+    try:
+        import fcntl
+        import struct
+        import termios
+        packed = fcntl.ioctl(sys.stdout.fileno(), termios.TIOCGWINSZ, b"\0" * 8)
+        rows, cols, width, height = struct.unpack("HHHH", packed)
+        if rows and cols and width and height:
+            return width // cols, height // rows
+    except Exception:
+        pass
+    return DEFAULT_CELL_SIZE
+
+
+def _supports_sixel():
+    """Asks the terminal for its primary device attributes; 4 means sixel."""
+    try:
+        import select
+        import termios
+        import tty
+    except ImportError:
+        return False
+    fd = sys.stdin.fileno()
+    old = termios.tcgetattr(fd)
+    try:
+        tty.setcbreak(fd)
+        sys.stdout.write("\x1b[c")
+        sys.stdout.flush()
+        response = ""
+        while select.select([sys.stdin], [], [], 0.2)[0]:
+            response += os.read(fd, 64).decode("ascii", "replace")
+            if response.endswith("c"):
+                break
+    finally:
+        termios.tcsetattr(fd, termios.TCSADRAIN, old)
+    return "4" in response.lstrip("\x1b[?").rstrip("c").split(";")
+
+
+def detect_protocol():
+    """Best preview protocol for this terminal, or None if stdout isn't one."""
+    if not (sys.stdout.isatty() and sys.stdin.isatty()):
+        return None
+    env = os.environ
+    if env.get("TERM") == "xterm-kitty" or "KITTY_WINDOW_ID" in env \
+            or env.get("TERM_PROGRAM") in ("WezTerm", "ghostty"):
+        return "kitty"
+    if _supports_sixel():
+        return "sixel"
+    return "blocks"
+
+
+def _fit(img, width, height):
+    """Downscales img to fit width x height (never enlarges)."""
+    img = img.convert("RGB")
+    img.thumbnail((max(1, width), max(1, height)))
+    return img
+
+
+def render_blocks(img, cols, rows):
+    """Half-block rendering: each character cell shows two stacked pixels."""
+    img = _fit(img, cols, rows * 2)
+    width, height = img.size
+    pixels = img.load()
+    lines = []
+    for y in range(0, height, 2):
+        parts = []
+        last = None
+        for x in range(width):
+            top = pixels[x, y]
+            bottom = pixels[x, y + 1] if y + 1 < height else None
+            colors = (top, bottom)
+            if colors != last:
+                code = "\x1b[38;2;%d;%d;%dm" % top
+                code += "\x1b[48;2;%d;%d;%dm" % bottom if bottom else "\x1b[49m"
+                parts.append(code)
+                last = colors
+            parts.append("▀")
+        lines.append("".join(parts) + "\x1b[0m")
+    return "\n".join(lines) + "\n"
+
+
+def render_kitty(img, cols, rows):
+    """Kitty graphics protocol: PNG data shown across cols x rows cells."""
+    cell_w, cell_h = cell_size()
+    img = _fit(img, cols * cell_w, rows * cell_h)
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", compress_level=1)
+    data = base64.standard_b64encode(buf.getvalue()).decode("ascii")
+
+    # Scale to whole cells keeping the aspect ratio
+    cols = max(1, min(cols, round(img.width / cell_w)))
+    rows = max(1, min(rows, round(img.height / cell_h)))
+    chunks = [data[i:i + 4096] for i in range(0, len(data), 4096)]
+    out = ["\x1b_Ga=d\x1b\\"]  # Drop the previous preview
+    for i, chunk in enumerate(chunks):
+        more = 1 if i < len(chunks) - 1 else 0
+        if i == 0:
+            out.append(f"\x1b_Ga=T,f=100,c={cols},r={rows},m={more};{chunk}\x1b\\")
+        else:
+            out.append(f"\x1b_Gm={more};{chunk}\x1b\\")
+    return "".join(out) + "\n"
+
+
+def render_sixel(img, cols, rows):
+    """Sixel graphics with an adaptive palette."""
+    cell_w, cell_h = cell_size()
+    img = _fit(img, cols * cell_w, rows * cell_h).quantize(colors=SIXEL_COLORS)
+    width, height = img.size
+    palette = img.getpalette()[:SIXEL_COLORS * 3]
+    pixels = img.load()
+
+    out = ['\x1bPq"1;1;%d;%d' % (width, height)]
+    for i in range(len(palette) // 3):
+        r, g, b = palette[i * 3:i * 3 + 3]
+        out.append("#%d;2;%d;%d;%d" % (i, r * 100 // 255, g * 100 // 255, b * 100 // 255))
+
+    for band in range(0, height, 6):
+        band_rows = range(band, min(band + 6, height))
+        # For each colour in the band, the 6-bit column masks of where it appears
+        masks = {}
+        for x in range(width):
+            for bit, y in enumerate(band_rows):
+                color = pixels[x, y]
+                column = masks.get(color)
+                if column is None:
+                    column = masks[color] = [0] * width
+                column[x] |= 1 << bit
+        first = True
+        for color, column in masks.items():
+            if not first:
+                out.append("$")
+            first = False
+            out.append("#%d" % color)
+            out.append(_sixel_run_length(column))
+        out.append("-")
+    out.append("\x1b\\")
+    return "".join(out) + "\n"
+
+
+def _sixel_run_length(column):
+    parts = []
+    run_char = None
+    run = 0
+    for value in column:
+        char = chr(63 + value)
+        if char == run_char:
+            run += 1
+            continue
+        if run_char is not None:
+            parts.append("!%d%s" % (run, run_char) if run > 3 else run_char * run)
+        run_char, run = char, 1
+    if run_char is not None:
+        parts.append("!%d%s" % (run, run_char) if run > 3 else run_char * run)
+    return "".join(parts)
+
+
+RENDERERS = {"kitty": render_kitty, "sixel": render_sixel, "blocks": render_blocks}
+
+
+def render_preview(ref, protocol, cols=None, rows=None):
+    """Decodes ref and returns the escape sequences that draw it."""
+    if cols is None or rows is None:
+        cols, rows = terminal_size()
+    with open_image(ref) as img:
+        img.draft("RGB", (cols * 16, rows * 32))  # Cheap JPEG downscale
+        return RENDERERS[protocol](img, cols, rows)
+
+
+class PreviewPrefetcher:
+    """Renders previews for upcoming images on a background thread.
+
+    ``get(i)`` returns the rendered preview for ``paths[i]`` (raising whatever
+    decoding raised) and queues the next ``depth`` images.
+    """
+
+    def __init__(self, paths, protocol, depth=3):
+        self.paths = paths
+        self.protocol = protocol
+        self.depth = depth
+        self._pool = ThreadPoolExecutor(max_workers=1)
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def _submit(self, i):
+        if 0 <= i < len(self.paths) and i not in self._futures:
+            self._futures[i] = self._pool.submit(render_preview, self.paths[i], self.protocol)
+
+    def get(self, i):
+        with self._lock:
+            for j in range(i, i + self.depth + 1):
+                self._submit(j)
+            future = self._futures.pop(i)
+            # Forget anything we've moved past
+            for j in [j for j in self._futures if j < i]:
+                self._futures.pop(j).cancel()
+        return future.result()
+
+    def close(self):
+        with self._lock:
+            for future in self._futures.values():
+                future.cancel()
+            self._futures = {}
+        self._pool.shutdown(wait=False)
+
+
+def read_key(prompt):
+    """Reads a single keypress without waiting for Enter.
+
+    Falls back to a normal line of input when stdin is not a terminal.
+    """
+    if not sys.stdin.isatty():
+        return input(prompt).strip()
+    print(prompt, end="", flush=True)
+    try:
+        import msvcrt
+        ch = msvcrt.getwch()
+    except ImportError:
+        import termios
+        import tty
+        fd = sys.stdin.fileno()
+        old = termios.tcgetattr(fd)
+        try:
+            tty.setcbreak(fd)
+            ch = sys.stdin.read(1)
+        finally:
+            termios.tcsetattr(fd, termios.TCSADRAIN, old)
+    if ch == "\x03":
+        raise KeyboardInterrupt
+    print(ch if ch.isprintable() else "")
+    return ch
@@ -9,18 +9,36 @@
 # ]
 # ///
 
+import io
 import os
+import sys
 import shutil
 import csv
 import json
+import queue
+import tarfile
+import zipfile
 import pytest
+import tkinter as tk
 from pathlib import Path
-from label_images_gui import LabelSession, CONFIG_FILE
+from PIL import Image, ImageFile
+from label_images_gui import ImageLabelerApp, LabelSession, CONFIG_FILE
+from image_sources import ImageSource, ZipSource, close_sources, open_image, parse_ref
+from integrity import CORRUPT, OK, OVERSIZED, IntegrityCache, check_image, iter_scan, scan_images
+from prelabel import run_prelabel
+from pools import iter_completed
+from tiles import DiskPyramid, MemoryPyramid, TileViewer, build_pyramid, pyramid_dir
+from categories import fuzzy_score, rank_categories
+from shards import merge_labels, parse_shard, report_path, select_shard
+from metadata import MetadataCache, group_starts, read_metadata
+from snapshot import snapshot_path
+from terminal_preview import PreviewPrefetcher, render_blocks, render_kitty, render_sixel
 
 # Fixture for a temporary directory with some dummy images
 @pytest.fixture
-def temp_workspace(tmp_path):
+def temp_workspace(tmp_path, monkeypatch):
     # Setup
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
     images_dir = tmp_path / "images"
     images_dir.mkdir()
     
@@ -143,6 +161,16 @@ def test_trash(temp_workspace):
     assert img_to_trash not in session.all_image_files
     assert len(session.image_files) == 2
 
+    # The indexes drop the file in place instead of being rebuilt
+    index = session.index
+    session.current_index = 0
+    session.save_label("cat")
+    assert session.move_to_trash() is True
+    assert session.index is index
+    assert session.index.counts["cat"] == 0 and session.labeled_count() == 0
+    session.apply_filter()
+    assert session.image_files == session.all_image_files == [images_dir / "img3.jpg"]
+
 def test_config_save_load(temp_workspace):
     session = LabelSession()
     session.categories.append("new_cat")
@@ -155,3 +183,622 @@ def test_config_save_load(temp_workspace):
     session2.load_config()
     assert "new_cat" in session2.categories
     assert session2.image_folder == "some/path"
+
+def test_zip_archive_source(temp_workspace):
+    tmp_path, images_dir = temp_workspace
+    Image.new("RGB", (8, 6), "red").save(images_dir / "real.png")
+    archive = tmp_path / "shard.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.write(images_dir / "real.png", "sub/real.png")
+        zf.write(images_dir / "real.png", "deflated.png", compress_type=zipfile.ZIP_DEFLATED)
+        zf.writestr("notes.txt", "not an image")
+
+    session = LabelSession()
+    session.load_images_from_folder(str(archive))
+    assert [str(f) for f in session.all_image_files] == [f"{archive}!deflated.png", f"{archive}!sub/real.png"]
+
+    # Both stored and deflated members decode without extraction
+    for ref in session.all_image_files:
+        assert open_image(ref).size == (8, 6)
+
+    session.save_label("cat")
+    assert f"{archive}!deflated.png" in session.labels
+
+    # Organizing streams the member out; archives are never modified
+    count, skipped, errors = session.organize(tmp_path / "out", is_move=True)
+    assert (count, skipped, errors) == (1, 0, 0)
+    assert (tmp_path / "out" / "cat" / "deflated.png").exists()
+    assert session.move_to_trash() is False
+    close_sources()
+
+def test_tar_archive_source(temp_workspace):
+    tmp_path, images_dir = temp_workspace
+    Image.new("RGB", (4, 4), "blue").save(images_dir / "real.png")
+    archive = tmp_path / "shard.tar"
+    with tarfile.open(archive, "w") as tf:
+        tf.add(images_dir / "real.png", "a/real.png")
+
+    session = LabelSession()
+    session.load_images_from_folder(str(archive))
+    assert len(session.image_files) == 1
+    ref = parse_ref(f"{archive}!a/real.png")
+    assert ref == session.image_files[0]
+    assert open_image(ref).size == (4, 4)
+    close_sources()
+
+def test_archive_source_cleans_up_on_bad_index(temp_workspace, monkeypatch):
+    tmp_path, _ = temp_workspace
+    archive = tmp_path / "broken.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("a.jpg", b"")
+    with pytest.raises(TypeError):
+        ImageSource(str(tmp_path))
+
+    # A failure while indexing releases the file and its mapping
+    opened = []
+    def bad_zip(file):
+        opened.append(file)
+        raise zipfile.BadZipFile("truncated")
+    monkeypatch.setattr(zipfile, "ZipFile", bad_zip)
+    with pytest.raises(zipfile.BadZipFile):
+        ZipSource(str(archive))
+    assert opened[0].closed
+
+def _redness_classifier(images, categories):
+    # Importable by name so prelabel worker processes can load it.
+    scores = []
+    for img in images:
+        r, g, b = img.resize((1, 1)).getpixel((0, 0))
+        scores.append({"red": r / 255, "other": 1 - r / 255})
+    return scores
+
+def test_prelabel_and_auto_accept(temp_workspace):
+    _, images_dir = temp_workspace
+    Image.new("RGB", (32, 32), (255, 0, 0)).save(images_dir / "a_red.png")
+    Image.new("RGB", (32, 32), (64, 0, 0)).save(images_dir / "b_dim.png")
+
+    session = LabelSession()
+    session.prelabel_model = "test_labeler:_redness_classifier"
+    session.load_labels()
+    session.load_images_from_folder(str(images_dir))
+    results = [r for batch in run_prelabel(session.unlabeled_files(), session.categories, session.suggestions,
+                                           model=session.prelabel_model, batch_size=2, workers=1) for r in batch]
+
+    # The three empty fixture files fail to decode and get no suggestion
+    assert sorted(r[0] for r in results) == [str(images_dir / "a_red.png"), str(images_dir / "b_dim.png")]
+    assert os.path.exists("image_labels.suggestions.json")
+
+    assert session.auto_accept(0.9) == 1
+    assert session.labels == {str(images_dir / "a_red.png"): "red"}
+
+    # One-key accept goes through save_label for the current image
+    session.apply_filter()
+    session.current_index = session.image_files.index(images_dir / "b_dim.png")
+    assert session.accept_suggestion() is True
+    assert session.labels[str(images_dir / "b_dim.png")] == "other"
+
+    # Suggestions survive a reload for the same model
+    session2 = LabelSession()
+    session2.prelabel_model = session.prelabel_model
+    session2.load_labels()
+    assert session2.suggestions.get(images_dir / "a_red.png")[0] == "red"
+
+def test_cancel_drops_queued_pool_work():
+    import time
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    cancel = threading.Event()
+    cancel.set()
+    pool = ThreadPoolExecutor(max_workers=1)
+    futures = [pool.submit(time.sleep, 0.05) for _ in range(40)]
+    started = time.monotonic()
+    finished = list(iter_completed(pool, futures, cancel))
+    pool.shutdown(wait=True)
+    assert time.monotonic() - started < 1.0
+    assert len(finished) < 10
+    assert sum(f.cancelled() for f in futures) > 30
+
+def test_integrity_scan_and_quarantine(temp_workspace):
+    _, images_dir = temp_workspace
+    Image.new("RGB", (16, 16), "green").save(images_dir / "good.png")
+    Image.new("RGB", (64, 64), "green").save(images_dir / "truncated.png")
+    data = (images_dir / "truncated.png").read_bytes()
+    (images_dir / "truncated.png").write_bytes(data[:len(data) // 2])
+
+    session = LabelSession()
+    session.load_images_from_folder(str(images_dir))
+    problems = scan_images(session.all_image_files, session.integrity_cache(), workers=1)
+
+    # The three empty fixture files and the truncated PNG are all corrupt
+    assert sorted(Path(p).name for p, (status, _) in problems.items() if status == CORRUPT) == \
+        ["img1.jpg", "img2.png", "img3.jpg", "truncated.png"]
+
+    # The GUI drops results as they arrive; quarantining them later still works
+    queue_ = queue.Queue()
+    for found in iter_scan(session.all_image_files, session.integrity_cache(), chunksize=1):
+        queue_.put(("batch", session.index, found))
+    queue_.put(("done", session.index, None))
+    refreshed = []
+    app = type("App", (), {"refresh_view": lambda self: refreshed.append(True)})()
+    app.session, app.scan_queue, app.scan_found, app.scan_report = session, queue_, {}, False
+    app.btn_check = type("Button", (), {"configure": lambda self, **kw: None})()
+    ImageLabelerApp._poll_integrity_scan(app)
+    assert [f.name for f in session.all_image_files] == ["good.png"] and refreshed
+    assert session.drop_corrupt(app.scan_found, move=True) == 4
+    assert (images_dir / "quarantine" / "truncated.png").exists()
+
+    # Results for a folder that is no longer open are ignored and the scan restarts
+    restarted = []
+    app.start_integrity_scan = lambda report: restarted.append(report)
+    queue_.put(("batch", object(), {str(images_dir / "good.png"): (CORRUPT, "stale")}))
+    queue_.put(("done", None, None))
+    ImageLabelerApp._poll_integrity_scan(app)
+    assert [f.name for f in session.all_image_files] == ["good.png"] and restarted == [False]
+
+    # Cached results are reused while the file is unchanged
+    cache = IntegrityCache(session.integrity.path)
+    assert cache.get(images_dir / "good.png") == (OK, "")
+
+def test_integrity_reports_oversized(temp_workspace, monkeypatch):
+    _, images_dir = temp_workspace
+    Image.new("RGB", (100, 100)).save(images_dir / "huge.png")
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 50 * 50)
+    assert check_image(str(images_dir / "huge.png"))[0] == OVERSIZED
+
+def test_tile_pyramid_viewer(temp_workspace):
+    tmp_path, images_dir = temp_workspace
+    img = Image.new("RGB", (1200, 800), "white")
+    img.paste((255, 0, 0), (0, 0, 600, 400))
+    img.save(images_dir / "aerial.png")
+
+    out_dir = build_pyramid(str(images_dir / "aerial.png"), pyramid_dir(images_dir / "aerial.png"), tile_size=128)
+    pyramid = DiskPyramid(out_dir)
+    assert pyramid.level_sizes == [(1200, 800), (600, 400), (300, 200), (150, 100), (75, 50)]
+
+    viewer = TileViewer(pyramid, max_tiles=8)
+    view = viewer.render(600, 400)
+    assert view.size == (600, 400)
+    assert view.getpixel((100, 100))[0] > 240 and view.getpixel((100, 100))[1] < 20
+    assert view.getpixel((500, 300))[:3] == (255, 255, 255)
+
+    # Zooming in on the red quadrant decodes only a few full-resolution tiles
+    viewer.zoom_at(4, 150, 100, 600, 400)
+    view = viewer.render(600, 400)
+    assert view.getpixel((300, 200))[0] > 240 and view.getpixel((300, 200))[1] < 20
+    assert all(level == 0 for level, _, _ in viewer._tiles)
+    assert len(viewer._tiles) <= 8
+
+    # Dragging right moves the view left, clamped to the image edge
+    viewer.pan(1000, 0, 600, 400)
+    assert viewer.center[0] == 0
+
+    viewer.rotation = 90
+    assert viewer.render(600, 400).size == (600, 400)
+
+    # Tiles live in the user's cache, and the least recently viewed pyramid goes first
+    assert out_dir.startswith(str(tmp_path / "cache"))
+    Image.new("RGB", (300, 300), "blue").save(images_dir / "other.png")
+    os.utime(os.path.join(out_dir, "meta.json"), (0, 0))
+    other_dir = build_pyramid(str(images_dir / "other.png"), pyramid_dir(images_dir / "other.png"),
+                              tile_size=128, max_cache_bytes=1)
+    assert not os.path.exists(out_dir) and DiskPyramid.exists(other_dir)
+
+    # Transparent images keep their alpha in the in-memory pyramid
+    badge = Image.new("RGBA", (100, 100), (0, 0, 0, 0))
+    badge.paste((0, 255, 0, 255), (0, 0, 50, 100))
+    view = TileViewer(MemoryPyramid(badge)).render(100, 100)
+    assert view.getpixel((25, 50)) == (0, 255, 0, 255)
+    assert view.getpixel((75, 50))[3] == 0
+
+def test_pyramid_built_in_bands(temp_workspace, monkeypatch):
+    tmp_path, images_dir = temp_workspace
+    img = Image.radial_gradient("L").resize((333, 301)).convert("RGB")
+    img.paste((255, 0, 0), (0, 0, 100, 150))
+    memory = MemoryPyramid(img, tile_size=64)
+
+    # Uncompressed files (including bottom-up BMP) are read band by band, never whole
+    for ext in ("png", "tif", "bmp", "ppm"):
+        img.save(images_dir / f"bands.{ext}")
+    with monkeypatch.context() as m:
+        m.setattr(ImageFile.ImageFile, "load", lambda self: pytest.fail("decoded whole"))
+        for ext in ("tif", "bmp", "ppm"):
+            build_pyramid(str(images_dir / f"bands.{ext}"), str(tmp_path / ext), tile_size=64)
+
+    build_pyramid(str(images_dir / "bands.png"), str(tmp_path / "png"), tile_size=64)
+    for ext in ("png", "tif", "bmp", "ppm"):
+        pyramid = DiskPyramid(str(tmp_path / ext))
+        assert pyramid.level_sizes == memory.level_sizes
+        for level, (width, height) in enumerate(memory.level_sizes):
+            for row in range(-(-height // 64)):
+                for col in range(-(-width // 64)):
+                    expected = io.BytesIO()
+                    memory.tile(level, col, row).save(expected, "JPEG", quality=90)
+                    assert pyramid.tile(level, col, row).tobytes() == Image.open(expected).tobytes()
+
+def test_project_roots_and_summaries(temp_workspace):
+    tmp_path, images_dir = temp_workspace
+    other_dir = tmp_path / "other"
+    other_dir.mkdir()
+    (other_dir / "x.jpg").touch()
+
+    session = LabelSession()
+    project = session.open_project(str(tmp_path / "proj.json"))
+    session.visit_root(str(images_dir))
+    session.save_label("cat")
+    session.visit_root(str(other_dir))
+    session.save_label("dog")
+
+    # Each root writes its own shard and the first root's summary was kept on leaving
+    assert project.find_root(str(images_dir))["csv_file"] != project.find_root(str(other_dir))["csv_file"]
+    assert project.find_root(str(images_dir))["summary"]["counts"] == {"cat": 1}
+    assert session.project_progress() == (2, 4)
+
+    # Revisiting restores the kept state instead of rescanning
+    session.visit_root(str(images_dir))
+    assert session.labels == {str(images_dir / "img1.jpg"): "cat"}
+    session.leave_root()
+
+    # Reopening uses only the summaries; nothing is loaded
+    session2 = LabelSession()
+    session2.open_project(str(tmp_path / "proj.json"))
+    assert session2.all_image_files == [] and session2.labels == {}
+    assert session2.project_progress() == (2, 4)
+    assert session2.project.last_root == str(images_dir)
+
+    # A shard edited outside the app is recounted on open
+    with open(project.find_root(str(other_dir))["csv_file"], "a", newline="") as f:
+        csv.writer(f).writerow([str(other_dir / "y.jpg"), "dog", "2024-01-01T00:00:00"])
+    session3 = LabelSession()
+    session3.open_project(str(tmp_path / "proj.json"))
+    assert session3.project.category_counts() == {"cat": 1, "dog": 2}
+
+def test_project_close_restores_label_file_and_remove_root(temp_workspace, monkeypatch):
+    tmp_path, images_dir = temp_workspace
+    other_dir = tmp_path / "other"
+    other_dir.mkdir()
+    (other_dir / "x.jpg").touch()
+
+    session = LabelSession()
+    session.csv_file = "mine.csv"
+    session.open_folder(str(images_dir))
+    session.open_project(str(tmp_path / "proj.json"))
+    session.visit_root(str(other_dir))
+    session.save_config()
+    with open(CONFIG_FILE) as f:
+        assert json.load(f)["csv_file"] == "mine.csv"  # not the root's shard
+
+    # Closing goes back to the folder and label file from before the project
+    session.close_project()
+    assert session.csv_file == "mine.csv"
+    assert session.image_folder == str(images_dir)
+    assert len(session.all_image_files) == 3
+    session.save_label("cat")
+    with open("mine.csv") as f:
+        assert "cat" in f.read()
+
+    # Removing the current root clears the view but keeps its shard
+    project = session.open_project(str(tmp_path / "proj.json"))
+    session.visit_root(str(other_dir))
+    shard = project.find_root(str(other_dir))["csv_file"]
+    session.save_label("dog")
+    session.remove_root(str(other_dir))
+    assert project.find_root(str(other_dir)) is None
+    assert session.all_image_files == [] and os.path.exists(shard)
+
+    # Only the most recently left roots stay in memory
+    third_dir = tmp_path / "third"
+    third_dir.mkdir()
+    monkeypatch.setattr("label_images_gui.MAX_ROOT_STATES", 1)
+    session.visit_root(str(images_dir))
+    session.visit_root(str(other_dir))
+    session.visit_root(str(third_dir))
+    assert list(session._root_states) == [str(other_dir)]
+
+def test_query_filters(temp_workspace):
+    _, images_dir = temp_workspace
+    (images_dir / "cam3_a.jpg").touch()
+    (images_dir / "cam3_b.jpg").touch()
+    session = LabelSession()
+    session.load_images_from_folder(str(images_dir))
+
+    session.current_index = session.image_files.index(images_dir / "cam3_a.jpg")
+    session.save_label("dog")
+    session.current_index = session.image_files.index(images_dir / "img1.jpg")
+    session.save_label("cat")
+    session.label_times[str(images_dir / "img1.jpg")] = "2000-01-01T00:00:00"
+    session.reindex()
+
+    session.set_query("cat:dog")
+    assert [f.name for f in session.image_files] == ["cam3_a.jpg"]
+    session.set_query("since:1h")
+    assert [f.name for f in session.image_files] == ["cam3_a.jpg"]
+    session.set_query("name:cam3_*")
+    # hide_labeled still applies when the query doesn't ask about labels
+    assert [f.name for f in session.image_files] == ["cam3_b.jpg"]
+    session.set_query("labeled name:cam3_*")
+    assert [f.name for f in session.image_files] == ["cam3_a.jpg"]
+    session.set_query("unlabeled name:img?.*")
+    assert [f.name for f in session.image_files] == ["img2.png", "img3.jpg"]
+
+    # Undo keeps the indexes in step with the labels
+    session.undo()
+    session.set_query("cat:cat")
+    assert session.image_files == []
+    assert session.labeled_count() == 1
+
+    session.set_query("")
+    assert session.query is None and len(session.image_files) == 4
+    with pytest.raises(ValueError):
+        session.set_query("colour:red")
+
+def test_query_path_prefix_in_archive(temp_workspace):
+    tmp_path, _ = temp_workspace
+    archive = tmp_path / "shard.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        for member in ["day/1.jpg", "night/1.jpg", "night/2.jpg", "nightly.jpg"]:
+            zf.writestr(member, b"")
+    session = LabelSession()
+    session.load_images_from_folder(str(archive))
+    session.set_query("path:night/")
+    assert [f.member for f in session.image_files] == ["night/1.jpg", "night/2.jpg"]
+
+    # Archive members come back from a snapshot as members, not paths
+    session.save_snapshot()
+    resumed = LabelSession()
+    resumed.image_folder = str(archive)
+    assert resumed.restore_snapshot()
+    assert resumed.all_image_files == session.all_image_files
+    close_sources()
+
+def test_open_folder_and_snapshot_resume(temp_workspace, monkeypatch):
+    _, images_dir = temp_workspace
+    session = LabelSession()
+    session.open_folder(str(images_dir))
+    assert len(session.all_image_files) == 3
+    session.save_label("cat")
+    session.drop_current()
+    session.current_index = 1
+    session.save_snapshot()
+
+    # A valid snapshot restores everything without parsing the CSV or scanning
+    session2 = LabelSession()
+    with monkeypatch.context() as m:
+        m.setattr(LabelSession, "_read_labels", lambda self: pytest.fail("CSV was parsed"))
+        m.setattr(LabelSession, "_scan_folder", lambda self, folder: pytest.fail("folder was scanned"))
+        session2.open_folder(str(images_dir), resume=True)
+    assert session2.labels == session.labels
+    assert session2.current_file() == images_dir / "img3.jpg"
+    assert session2.index.counts == session.index.counts
+
+    # Snapshots are JSON in the user's cache, not beside the (possibly shared) label file
+    path = snapshot_path(session.csv_file)
+    assert path.startswith(str(temp_workspace[0] / "cache"))
+    assert not os.path.exists(Path(session.csv_file).with_suffix(".snapshot"))
+    with open(path, encoding='utf-8') as f:
+        assert json.load(f)["files"] == [str(f) for f in session.all_image_files]
+
+    # Any change to the label file invalidates it
+    session.current_index = 0
+    session.save_label("dog")
+    session3 = LabelSession()
+    session3.open_folder(str(images_dir), resume=True)
+    assert len(session3.labels) == 2
+    assert session3.current_index == 0
+
+    # A file that isn't a folder or archive leaves the open folder in place
+    notes = temp_workspace[0] / "notes.zip.txt"
+    notes.write_text("not an archive")
+    with pytest.raises(ValueError):
+        session3.open_folder(str(notes), resume=True)
+    assert session3.image_folder == str(images_dir)
+    assert len(session3.all_image_files) == 3
+
+def test_terminal_previews(temp_workspace):
+    _, images_dir = temp_workspace
+    img = Image.new('RGB', (40, 20), color=(255, 0, 0))
+    # Half blocks: two pixel rows per line, fitted inside 20 x 5 cells
+    blocks = render_blocks(img, 20, 5)
+    assert len(blocks.splitlines()) == 5
+    assert "\x1b[38;2;255;0;0m" in blocks
+    assert render_kitty(img, 20, 5).startswith("\x1b_Ga=d")
+    sixel = render_sixel(img, 20, 5)
+    assert sixel.startswith("\x1bPq") and sixel.rstrip().endswith("\x1b\\")
+
+    files = []
+    for i in range(3):
+        files.append(images_dir / f"color{i}.png")
+        Image.new('RGB', (8, 8), color=(0, 80 * i, 0)).save(files[-1])
+    files.append(images_dir / "missing.jpg")
+    prefetcher = PreviewPrefetcher(files, "blocks", depth=2)
+    try:
+        for i in range(3):
+            assert prefetcher.get(i).endswith("\x1b[0m\n")
+        with pytest.raises(OSError):
+            prefetcher.get(3)
+    finally:
+        prefetcher.close()
+
+def test_category_ranking(temp_workspace):
+    _, images_dir = temp_workspace
+    assert fuzzy_score("dog", "dog") > fuzzy_score("dog", "hot dog") > fuzzy_score("dog", "bulldog")
+    assert fuzzy_score("gr", "golden retriever") is not None
+    assert fuzzy_score("xyz", "dog") is None
+
+    categories = ["cat", "dog", "golden retriever", "goldfish"]
+    assert rank_categories(categories, "gold") == ["goldfish", "golden retriever"]
+    assert rank_categories(categories, "gr") == ["golden retriever"]
+
+    # Frequency and recency come from the label index and follow undo
+    session = LabelSession()
+    session.open_folder(str(images_dir))
+    session.categories = categories
+    session.save_label("dog")
+    session.drop_current()
+    session.save_label("dog")
+    session.drop_current()
+    session.save_label("goldfish")
+    session.category_order = "frequent"
+    assert session.ranked_categories()[:2] == ["dog", "goldfish"]
+    session.category_order = "recent"
+    assert session.ranked_categories()[:2] == ["goldfish", "dog"]
+    session.undo()
+    session.category_order = "frequent"
+    assert session.index.counts["goldfish"] == 0
+    assert session.ranked_categories("o") == ["dog", "goldfish", "golden retriever"]
+    session.category_order = "recent"
+    assert session.ranked_categories() == ["dog", "cat", "golden retriever", "goldfish"]
+    assert "goldfish" not in session.index.last_used
+    session.undo()
+    assert session.index.last_used["dog"] == min(session.label_times.values())
+
+def test_category_search_keys_stop_at_the_entry():
+    # Returning "break" keeps Enter from also reaching the window's
+    # accept-suggestion binding, which would label a second image.
+    picked = []
+    cleared = []
+    app = type("App", (), {"pick_category": lambda self, pos: picked.append(pos),
+                           "clear_category_search": lambda self: cleared.append(True)})()
+    assert ImageLabelerApp.on_category_search_return(app, None) == "break"
+    assert ImageLabelerApp.on_category_search_escape(app, None) == "break"
+    assert picked == [0] and cleared == [True]
+
+    # Arrow keys move the text cursor, not the image, while a text field has focus
+    moves = []
+    app = type("App", (), {"prev_image": lambda self: moves.append(-1),
+                           "next_image": lambda self: moves.append(1)})()
+    app.focus_get = lambda: tk.Entry.__new__(tk.Entry)
+    ImageLabelerApp.on_arrow_key(app, 1)
+    app.focus_get = lambda: None
+    ImageLabelerApp.on_arrow_key(app, -1)
+    ImageLabelerApp.on_arrow_key(app, 1)
+    assert moves == [-1, 1]
+
+def test_shards_partition_folder(temp_workspace):
+    _, images_dir = temp_workspace
+    for i in range(20):
+        (images_dir / f"extra{i}.jpg").touch()
+    assert parse_shard("2/4") == (2, 4)
+    for bad in ("0/4", "5/4", "2", "a/b"):
+        with pytest.raises(ValueError):
+            parse_shard(bad)
+
+    slices = []
+    for i in range(1, 4):
+        session = LabelSession()
+        session.shard = (i, 3)
+        session.open_folder(str(images_dir))
+        slices.append([str(f) for f in session.all_image_files])
+    assert sorted(sum(slices, [])) == sorted(str(f) for f in images_dir.iterdir())
+    assert all(slices)
+
+    # The split depends on paths inside the folder, not where it lives
+    moved = shutil.copytree(images_dir, images_dir.parent / "elsewhere")
+    session = LabelSession()
+    session.shard = (1, 3)
+    session.open_folder(str(moved))
+    assert [f.name for f in session.all_image_files] == [Path(p).name for p in slices[0]]
+
+    # However the root is spelled, the keys and so the slices are the same
+    files = sorted(Path("images").iterdir())
+    for root in ("images", "images/", "./images", str(images_dir)):
+        assert [f.name for f in select_shard(files, root, (1, 3))] == [Path(p).name for p in slices[0]]
+    with pytest.raises(ValueError):
+        select_shard(files, str(moved), (1, 3))
+
+def test_merge_label_files(temp_workspace):
+    tmp_path, _ = temp_workspace
+    header = ["image_path", "category", "timestamp"]
+    files = {
+        "a.csv": [["x.jpg", "cat", "2024-01-01T10:00"], ["y.jpg", "dog", "2024-01-01T10:00"],
+                  ["x.jpg", "dog", "2024-01-01T11:00"]],
+        "b.csv": [["y.jpg", "dog", "2024-01-02T10:00"], ["z.jpg", "car", "2024-01-01T09:00"]],
+        "c.csv": [["x.jpg", "cat", "2024-01-01T12:00"], ["bad"]],
+    }
+    for name, rows in files.items():
+        with open(tmp_path / name, 'w', newline='') as f:
+            csv.writer(f).writerows([header] + rows)
+
+    # Tiny runs exercise the on-disk sort
+    stats = merge_labels(list(files), "merged.csv", run_rows=2)
+    assert stats == {"rows": 6, "bad_rows": 1, "images": 3, "conflicts": 2, "disagreements": 1}
+    with open("merged.csv", newline='') as f:
+        assert list(csv.reader(f))[1:] == [["x.jpg", "cat", "2024-01-01T12:00"],
+                                           ["y.jpg", "dog", "2024-01-02T10:00"],
+                                           ["z.jpg", "car", "2024-01-01T09:00"]]
+    with open(report_path("merged.csv"), newline='') as f:
+        report = list(csv.reader(f))[1:]
+    assert [(row[1], row[2]) for row in report] == [("a.csv", "dog"), ("c.csv", "cat")]
+
+    files["d.csv"] = [["x.jpg", "dog", "2024-01-01T08:00"]]
+    with open(tmp_path / "d.csv", 'w', newline='') as f:
+        csv.writer(f).writerows([header] + files["d.csv"])
+    merge_labels(list(files), "merged.csv", policy="majority")
+    with open("merged.csv", newline='') as f:
+        assert list(csv.reader(f))[1] == ["x.jpg", "dog", "2024-01-01T11:00"]
+
+    # Files labeled on differently mounted copies merge by path inside their root
+    with open("home.csv", 'w', newline='') as f:
+        csv.writer(f).writerows([header, ["/home/a/data/x.jpg", "cat", "2024-01-01T10:00"],
+                                 ["/elsewhere/y.jpg", "cat", "2024-01-01T10:00"]])
+    with open("mnt.csv", 'w', newline='') as f:
+        csv.writer(f).writerows([header, ["/mnt/data/x.jpg", "dog", "2024-01-01T11:00"],
+                                 ["/mnt/data.zip!sub/z.jpg", "car", "2024-01-01T11:00"]])
+    stats = merge_labels(["home.csv", "mnt.csv"], "mounted.csv", roots=["/home/a/data", "/mnt/data"])
+    assert (stats["bad_rows"], stats["conflicts"]) == (2, 1)
+    with open("mounted.csv", newline='') as f:
+        assert list(csv.reader(f))[1:] == [["x.jpg", "dog", "2024-01-01T11:00"]]
+    stats = merge_labels(["mnt.csv"], "archive.csv", roots=["/mnt/data.zip"])
+    with open("archive.csv", newline='') as f:
+        assert [row[0] for row in csv.reader(f)][1:] == ["sub/z.jpg"]
+
+    # No report file unless something disagrees
+    stats = merge_labels(["b.csv"], "single.csv")
+    assert stats["disagreements"] == 0
+    assert not os.path.exists(report_path("single.csv"))
+
+def test_merge_cli_needs_output(temp_workspace, monkeypatch):
+    import label_images
+    monkeypatch.setattr(sys, "argv", ["label_images.py", "--merge", "a.csv"])
+    with pytest.raises(SystemExit):
+        label_images.parse_args()
+
+def _exif_image(path, taken, camera, size=(8, 8)):
+    exif = Image.Exif()
+    exif[271], exif[272] = camera.split(" ", 1)
+    exif.get_ifd(0x8769)[36867] = taken
+    Image.new('RGB', size).save(path, exif=exif)
+
+def test_metadata_sort_and_groups(temp_workspace):
+    _, images_dir = temp_workspace
+    for name in ("img1.jpg", "img2.png", "img3.jpg"):
+        (images_dir / name).unlink()
+    # Two bursts from one camera a minute apart, one shot from another camera
+    _exif_image(images_dir / "a.jpg", "2024:05:01 10:01:00", "Canon R5")
+    _exif_image(images_dir / "b.jpg", "2024:05:01 10:00:01", "Canon R5")
+    _exif_image(images_dir / "c.jpg", "2024:05:01 10:00:00", "Canon R5")
+    _exif_image(images_dir / "d.jpg", "2024:05:01 10:01:01", "Canon R5")
+    _exif_image(images_dir / "e.jpg", "2024:05:01 10:00:02", "Nikon Z6", size=(16, 8))
+    assert read_metadata(str(images_dir / "a.jpg")) == {
+        "time": "2024-05-01T10:01:00", "camera": "Canon R5", "width": 8, "height": 8}
+
+    session = LabelSession()
+    session.open_folder(str(images_dir))
+    assert session.index_metadata(workers=2) == 5
+    assert session.index_metadata(workers=2) == 0  # cached by stamp
+    session.sort_by = "time"
+    session.apply_filter()
+    assert [f.name for f in session.image_files] == ["c.jpg", "b.jpg", "e.jpg", "a.jpg", "d.jpg"]
+    record = MetadataCache(session.metadata.path).record
+    assert group_starts(session.image_files, record, "time") == [0, 2, 3]
+    assert session.current_group() == (0, 2)
+
+    # Labeling the burst labels both shots and moves on to the Nikon image
+    assert session.label_group("dog") == 2
+    assert session.labels == {str(images_dir / "c.jpg"): "dog", str(images_dir / "b.jpg"): "dog"}
+    assert session.current_file().name == "e.jpg"
+    assert session.current_group() == (0, 1)
+
+    session.sort_by = "size"
+    session.apply_filter()
+    assert session.image_files[-1].name == "e.jpg"
+    assert session.current_group() == (0, 2)
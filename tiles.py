@@ -0,0 +1,367 @@
+"""Tiled multi-resolution viewing for very large images.
+
+Images above ``TILE_THRESHOLD`` pixels are cut once into a pyramid of
+``TILE_SIZE`` tiles on disk (each level half the size of the one below),
+under the per-user cache directory. The least recently viewed pyramids are
+removed once the cache grows past ``MAX_TILE_CACHE_BYTES``. The viewer then
+decodes only the tiles covering the viewport at the current zoom and keeps a
+bounded LRU of them, so zooming and panning never touch the full image
+again. Smaller images use the same viewer over an in-memory pyramid.
+
+The pyramid is built in bands of ``TILE_SIZE`` rows, each level fed by the
+downsampled bands of the one below. Uncompressed files (TIFF, BMP, PPM) are
+read band by band, so memory stays at a few bands whatever the image size.
+Pillow can only decode compressed images (JPEG, PNG, compressed TIFF)
+whole, so for those the decoded image is held once while the bands are cut.
+"""
+
+import os
+import json
+import math
+import shutil
+import hashlib
+import warnings
+from collections import OrderedDict
+from pathlib import Path
+
+from PIL import Image
+
+from image_sources import open_image, parse_ref
+from integrity import file_stamp
+from snapshot import user_cache_dir
+
+TILE_SIZE = 512
+TILE_THRESHOLD = 50_000_000  # pixels; bigger images are viewed from a disk pyramid
+MAX_TILE_CACHE_BYTES = 2 * 1024 ** 3
+_RAW_BYTES = {"L": 1, "LA": 2, "RGB": 3, "BGR": 3, "RGBA": 4, "RGBX": 4, "BGRA": 4, "BGRX": 4}
+MAX_CACHED_TILES = 64
+MIN_ZOOM = 1 / 256
+MAX_ZOOM = 16.0
+
+
+def should_tile(ref):
+    """True if ref is too large to decode whole in the viewer. Reads only the header."""
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            with open_image(ref) as img:
+                return img.width * img.height > TILE_THRESHOLD
+    except Image.DecompressionBombError:
+        return True
+
+
+def tile_cache_dir():
+    return os.path.join(user_cache_dir(), "tiles")
+
+
+def pyramid_dir(ref, cache_root=None):
+    """Cache folder for ref's pyramid; changes whenever the file does."""
+    key = json.dumps([str(ref)] + file_stamp(ref))
+    return os.path.join(cache_root or tile_cache_dir(), hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+
+def _dir_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+def prune_tile_cache(cache_root, max_bytes=MAX_TILE_CACHE_BYTES, keep=None):
+    """Removes the least recently viewed pyramids until the cache fits max_bytes.
+
+    Pyramids of files that have since changed are never viewed again, so
+    they age out first. keep is never removed. Returns the removed folders.
+    """
+    pyramids = []
+    for entry in os.scandir(cache_root):
+        if entry.is_dir() and DiskPyramid.exists(entry.path):
+            used = os.path.getmtime(os.path.join(entry.path, "meta.json"))
+            pyramids.append((used, entry.path, _dir_size(entry.path)))
+    total = sum(size for _, _, size in pyramids)
+    removed = []
+    for _, path, size in sorted(pyramids):
+        if total <= max_bytes:
+            break
+        if keep is not None and os.path.samefile(path, keep):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        removed.append(path)
+    return removed
+
+
+def _raw_strips(ref, img):
+    """Row strips of an uncompressed image file as (top, bottom, offset,
+    rawmode, stride, orientation), or None if it can't be read band by band."""
+    if not isinstance(ref, Path):
+        return None
+    strips = []
+    for codec, (x0, y0, x1, y1), offset, args in img.tile:
+        args = (args,) if isinstance(args, str) else tuple(args)
+        rawmode, stride, orientation = (args + (0, 1))[:3]
+        if codec != "raw" or rawmode not in _RAW_BYTES or orientation not in (1, -1) \
+                or (x0, x1) != (0, img.width):
+            return None
+        strips.append((y0, y1, offset, rawmode, stride or img.width * _RAW_BYTES[rawmode], orientation))
+    return strips
+
+
+def _read_rows(f, strips, mode, width, top, bottom):
+    band = Image.new(mode, (width, bottom - top))
+    for y0, y1, offset, rawmode, stride, orientation in strips:
+        lo, hi = max(top, y0), min(bottom, y1)
+        if lo >= hi:
+            continue
+        # Bottom-up strips store their last row first
+        f.seek(offset + ((lo - y0) if orientation == 1 else (y1 - hi)) * stride)
+        data = f.read((hi - lo) * stride)
+        band.paste(Image.frombytes(mode, (width, hi - lo), data, "raw", rawmode, stride, orientation),
+                   (0, lo - top))
+    return band
+
+
+def _bands(ref, img, rows):
+    """The image top to bottom in RGB bands of rows."""
+    width, height = img.size
+    strips = _raw_strips(ref, img)
+    if strips is None:
+        img.load()
+        for top in range(0, height, rows):
+            yield img.crop((0, top, width, min(height, top + rows))).convert("RGB")
+        return
+    with open(ref, 'rb') as f:
+        for top in range(0, height, rows):
+            yield _read_rows(f, strips, img.mode, width, top, min(height, top + rows)).convert("RGB")
+
+
+def build_pyramid(path_str, out_dir, tile_size=TILE_SIZE, max_cache_bytes=MAX_TILE_CACHE_BYTES):
+    """Writes every level's tiles plus meta.json, then prunes the cache to
+    max_cache_bytes. Works in bands of tile_size rows (see the module notes).
+
+    Meant to run in a worker process: it lifts Pillow's decompression-bomb
+    limit, which is exactly the case this pyramid exists for.
+    """
+    Image.MAX_IMAGE_PIXELS = None
+    tmp_dir = out_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    ref = parse_ref(path_str)
+    with open_image(ref) as img:
+        sizes = [img.size]
+        while max(sizes[-1]) > tile_size:
+            sizes.append((math.ceil(sizes[-1][0] / 2), math.ceil(sizes[-1][1] / 2)))
+        for level in range(len(sizes)):
+            os.makedirs(os.path.join(tmp_dir, str(level)))
+
+        pending = [[] for _ in sizes]  # bands waiting to fill a row of tiles, per level
+        done = [0] * len(sizes)  # rows written, per level
+
+        def push(level, band):
+            pending[level].append(band)
+            rows = sum(b.height for b in pending[level])
+            width, height = sizes[level]
+            if rows < tile_size and done[level] + rows < height:
+                return
+            row_img = pending[level][0]
+            if len(pending[level]) > 1:
+                row_img = Image.new("RGB", (width, rows))
+                top = 0
+                for b in pending[level]:
+                    row_img.paste(b, (0, top))
+                    top += b.height
+            pending[level] = []
+            level_dir = os.path.join(tmp_dir, str(level))
+            row = done[level] // tile_size
+            for col in range(math.ceil(width / tile_size)):
+                box = (col * tile_size, 0, min(width, (col + 1) * tile_size), rows)
+                row_img.crop(box).save(os.path.join(level_dir, f"{col}_{row}.jpg"), quality=90)
+            done[level] += rows
+            if level + 1 < len(sizes):
+                push(level + 1, row_img.reduce(2))
+
+        for band in _bands(ref, img, tile_size):
+            push(0, band)
+
+    with open(os.path.join(tmp_dir, "meta.json"), 'w') as f:
+        json.dump({"tile_size": tile_size, "levels": [list(size) for size in sizes]}, f)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    prune_tile_cache(os.path.dirname(out_dir), max_cache_bytes, keep=out_dir)
+    return out_dir
+
+
+class DiskPyramid:
+    """Tiles written by build_pyramid."""
+
+    def __init__(self, path):
+        self.path = path
+        meta_path = os.path.join(path, "meta.json")
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        os.utime(meta_path)  # Marks it recently viewed for prune_tile_cache
+        self.tile_size = meta["tile_size"]
+        self.level_sizes = [tuple(size) for size in meta["levels"]]
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(os.path.join(path, "meta.json"))
+
+    def tile(self, level, col, row):
+        img = Image.open(os.path.join(self.path, str(level), f"{col}_{row}.jpg"))
+        img.load()
+        return img
+
+
+class MemoryPyramid:
+    """Pyramid over an already decoded image; levels are reduced on demand."""
+
+    def __init__(self, image, tile_size=TILE_SIZE):
+        self.tile_size = tile_size
+        self._levels = [image]
+        self.level_sizes = [image.size]
+        width, height = image.size
+        while max(width, height) > tile_size:
+            width, height = math.ceil(width / 2), math.ceil(height / 2)
+            self.level_sizes.append((width, height))
+
+    def tile(self, level, col, row):
+        while len(self._levels) <= level:
+            self._levels.append(self._levels[-1].reduce(2))
+        width, height = self.level_sizes[level]
+        size = self.tile_size
+        return self._levels[level].crop((col * size, row * size,
+                                         min(width, (col + 1) * size), min(height, (row + 1) * size)))
+
+
+class TileViewer:
+    """Zoom/pan state over a pyramid and rendering of the visible region.
+
+    ``zoom`` is display pixels per full-resolution pixel, ``None`` meaning fit
+    to the viewport. ``rotation`` is in degrees counter-clockwise, matching
+    ``Image.rotate``; pan and zoom take display coordinates and undo it.
+    """
+
+    def __init__(self, pyramid, max_tiles=MAX_CACHED_TILES):
+        self.pyramid = pyramid
+        self.width, self.height = pyramid.level_sizes[0]
+        self.zoom = None
+        self.center = (self.width / 2, self.height / 2)
+        self.rotation = 0
+        self.max_tiles = max_tiles
+        self._tiles = OrderedDict()  # (level, col, row) -> image, least recent first
+
+    def _view_size(self, view_w, view_h):
+        """Viewport size in the unrotated frame."""
+        if self.rotation % 180:
+            return view_h, view_w
+        return view_w, view_h
+
+    def _unrotate(self, x, y, view_w, view_h):
+        """Maps a display point to the unrotated viewport."""
+        w, h = self._view_size(view_w, view_h)
+        if self.rotation == 90:
+            return w - y, x
+        if self.rotation == 180:
+            return w - x, h - y
+        if self.rotation == 270:
+            return y, h - x
+        return x, y
+
+    def fit_zoom(self, view_w, view_h):
+        w, h = self._view_size(view_w, view_h)
+        return min(w / self.width, h / self.height)
+
+    def current_zoom(self, view_w, view_h):
+        return self.zoom if self.zoom is not None else self.fit_zoom(view_w, view_h)
+
+    def reset(self):
+        self.zoom = None
+        self.center = (self.width / 2, self.height / 2)
+
+    def zoom_at(self, factor, x, y, view_w, view_h):
+        """Zooms by factor keeping the image point under display (x, y) fixed."""
+        zoom = self.current_zoom(view_w, view_h)
+        new_zoom = min(MAX_ZOOM, max(MIN_ZOOM, zoom * factor))
+        w, h = self._view_size(view_w, view_h)
+        ux, uy = self._unrotate(x, y, view_w, view_h)
+        # Image point under the cursor before and after must coincide.
+        px = self.center[0] + (ux - w / 2) / zoom
+        py = self.center[1] + (uy - h / 2) / zoom
+        self.center = (px - (ux - w / 2) / new_zoom, py - (uy - h / 2) / new_zoom)
+        self.zoom = new_zoom
+        self._clamp_center()
+
+    def pan(self, dx, dy, view_w, view_h):
+        """Moves the image by a display-pixel drag of (dx, dy)."""
+        zoom = self.current_zoom(view_w, view_h)
+        x0, y0 = self._unrotate(0, 0, view_w, view_h)
+        x1, y1 = self._unrotate(dx, dy, view_w, view_h)
+        self.center = (self.center[0] - (x1 - x0) / zoom, self.center[1] - (y1 - y0) / zoom)
+        self._clamp_center()
+
+    def _clamp_center(self):
+        self.center = (min(self.width, max(0, self.center[0])), min(self.height, max(0, self.center[1])))
+
+    def _level_for(self, zoom):
+        """Coarsest level that still has at least one pixel per display pixel."""
+        if zoom >= 1:
+            return 0
+        level = int(math.floor(math.log2(1 / zoom)))
+        return min(level, len(self.pyramid.level_sizes) - 1)
+
+    def _tile(self, key):
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+            return tile
+        tile = self.pyramid.tile(*key)
+        self._tiles[key] = tile
+        while len(self._tiles) > self.max_tiles:
+            self._tiles.popitem(last=False)
+        return tile
+
+    def render(self, view_w, view_h):
+        """Returns a view_w x view_h RGBA image of the visible region."""
+        view_w, view_h = max(1, int(view_w)), max(1, int(view_h))
+        w, h = self._view_size(view_w, view_h)
+        if self.zoom is None:
+            self.center = (self.width / 2, self.height / 2)
+        zoom = self.current_zoom(view_w, view_h)
+        canvas = Image.new("RGBA", (w, h), (0, 0, 0, 0))
+
+        # Visible rectangle in full-resolution coordinates
+        left = self.center[0] - w / 2 / zoom
+        top = self.center[1] - h / 2 / zoom
+        x0, y0 = max(0.0, left), max(0.0, top)
+        x1, y1 = min(self.width, left + w / zoom), min(self.height, top + h / zoom)
+        if x1 > x0 and y1 > y0:
+            level = self._level_for(zoom)
+            level_w, level_h = self.pyramid.level_sizes[level]
+            sx, sy = level_w / self.width, level_h / self.height
+            size = self.pyramid.tile_size
+
+            lx0, ly0 = int(x0 * sx), int(y0 * sy)
+            lx1, ly1 = min(level_w, math.ceil(x1 * sx)), min(level_h, math.ceil(y1 * sy))
+            col0, row0 = lx0 // size, ly0 // size
+            col1, row1 = (lx1 - 1) // size, (ly1 - 1) // size
+
+            region = Image.new("RGBA", ((col1 - col0 + 1) * size, (row1 - row0 + 1) * size))
+            for row in range(row0, row1 + 1):
+                for col in range(col0, col1 + 1):
+                    region.paste(self._tile((level, col, row)), ((col - col0) * size, (row - row0) * size))
+            region = region.crop((lx0 - col0 * size, ly0 - row0 * size, lx1 - col0 * size, ly1 - row0 * size))
+
+            out_w = max(1, round((lx1 - lx0) / sx * zoom))
+            out_h = max(1, round((ly1 - ly0) / sy * zoom))
+            resample = Image.Resampling.NEAREST if zoom * (1 / sx) > 2 else Image.Resampling.BILINEAR
+            region = region.resize((out_w, out_h), resample)
+            canvas.paste(region, (round((lx0 / sx - left) * zoom), round((ly0 / sy - top) * zoom)))
+
+        if self.rotation:
+            canvas = canvas.rotate(self.rotation, expand=True)
+        return canvas